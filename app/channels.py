@@ -0,0 +1,135 @@
+# coding: utf-8
+# Directory of the workspace's channels, for looking up channel IDs by name (and channel names by ID) without calling the Web API
+# It is built with a paginated scan of conversations.list and kept fresh by the channel events (see handlers/utils/channels.py)
+# Events are only delivered to one worker, so every worker also rebuilds its directory periodically
+# This also streams the members of a channel across all pages of conversations.members
+
+# Import libraries
+import asyncio
+import logging
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelDirectory:
+    def __init__(self, client):
+        self.client = client
+        self.names = {}  # Channel ID to channel name
+        self.ids = {}  # Channel name to channel ID
+        self.loaded = False
+        self.lock = asyncio.Lock()
+
+    # Scan all public and private channels that the bot can see, one page at a time
+    async def scan(self):
+        names = {}
+        cursor = None
+
+        while True:
+            response = await self.client.conversations_list(
+                types="public_channel,private_channel",
+                exclude_archived=True,
+                limit=settings.CHANNEL_DIRECTORY_PAGE_SIZE,
+                cursor=cursor,
+            )
+
+            for channel in response["channels"]:
+                names[channel["id"]] = channel["name"]
+
+            cursor = response.get("response_metadata", {}).get("next_cursor")
+            if not cursor:
+                break
+
+        # Swap in the new lookup tables at once, so that lookups never see a half-built directory
+        self.names = names
+        self.ids = {name: channel_id for channel_id, name in names.items()}
+        self.loaded = True
+
+    async def refresh(self):
+        async with self.lock:
+            await self.scan()
+
+        return len(self.names)
+
+    # Make sure that the directory has been built once (lookups made while the first scan is running wait for it)
+    async def ensure_loaded(self):
+        if not self.loaded:
+            async with self.lock:
+                if not self.loaded:
+                    await self.scan()
+
+    def add(self, channel_id, name):
+        old_name = self.names.get(channel_id)
+        if old_name is not None and self.ids.get(old_name) == channel_id:
+            del self.ids[old_name]
+
+        self.names[channel_id] = name
+        self.ids[name] = channel_id
+
+    def remove(self, channel_id):
+        name = self.names.pop(channel_id, None)
+        if name is not None and self.ids.get(name) == channel_id:
+            del self.ids[name]
+
+    # Return the ID of the channel with the given name, or None if there is no such channel (or the bot cannot see it)
+    async def channel_id(self, name):
+        await self.ensure_loaded()
+        return self.ids.get(name.lstrip("#"))
+
+    # Return a mention of the channel with the given name to be used in messages
+    # A channel that cannot be found is named in plain text instead, since a mention needs its ID
+    async def mention(self, name):
+        channel_id = await self.channel_id(name)
+
+        if channel_id is None:
+            logger.warning(f"Channel #{name.lstrip('#')} is not in the channel directory.")
+            return f"#{name.lstrip('#')}"
+
+        return f"<#{channel_id}>"
+
+    # Return the name of the channel with the given ID, or None if it does not have one (such as a direct message)
+    # Channels that this worker has not heard of yet (such as one created after its last scan) are looked up once and remembered
+    async def channel_name(self, channel_id):
+        await self.ensure_loaded()
+
+        if channel_id not in self.names:
+            response = await self.client.conversations_info(channel=channel_id)
+            name = response["channel"].get("name")
+            if name is None:
+                return None
+
+            self.add(channel_id, name)
+
+        return self.names[channel_id]
+
+
+# Yield the user IDs of all members of a channel, one page of conversations.members at a time
+# The next page is requested as soon as its cursor is known, so it is fetched while the caller goes through the current page
+# Members in the excluded set (such as the bot itself) are skipped
+async def channel_members(client, channel_id, excluded=frozenset()):
+    request = asyncio.ensure_future(
+        client.conversations_members(
+            channel=channel_id, limit=settings.CHANNEL_MEMBERS_PAGE_SIZE
+        )
+    )
+
+    while request is not None:
+        response = await request
+
+        cursor = response.get("response_metadata", {}).get("next_cursor")
+        request = (
+            asyncio.ensure_future(
+                client.conversations_members(
+                    channel=channel_id,
+                    limit=settings.CHANNEL_MEMBERS_PAGE_SIZE,
+                    cursor=cursor,
+                )
+            )
+            if cursor
+            else None
+        )
+
+        for member in response["members"]:
+            if member not in excluded:
+                yield member
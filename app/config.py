@@ -6,12 +6,17 @@
 
 # Do take note that Windows does not support uvloop at the moment
 import asyncio
+import socket
+import time
 import uvloop
 
 import slack
 import settings
-from databases.dbhelper import DBHelper
-from databases.firebaser import FireConn
+from databases.dbhelper import DBHelper, AsyncDBHelper, LeaderLock
+from databases.conversations import MemoryConn, SQLiteConn, AsyncConversationBackend
+from databases.firebaser import FireConn, AsyncFireConn
+from outbound import SlackGateway
+from channels import ChannelDirectory
 import handlers.utils.fallback
 from slackers.hooks import commands
 import logging
@@ -23,9 +28,8 @@ logger = logging.getLogger(__name__)
 # Import database SQLAlchemy class (main instance)
 db = DBHelper()
 
-# Add category list to database
-if not db.get_all_categories():
-    db.add_all_categories()
+# Awaitable wrapper around the main instance for async handlers
+async_db = AsyncDBHelper(db)
 
 
 # Conversation state tracking constants only for judging functions
@@ -42,7 +46,71 @@ if not db.get_all_categories():
     CONVERSATION_END,
 ) = range(8)
 
-conv_handler = FireConn()
+
+# State that a judge's conversation starts in when it is not tracked yet
+def initial_state(user_id):
+    if db.check_score_existence(user_id):
+        return CONVERSATION_END
+    else:
+        return INITIAL_STATE
+
+
+# Conversation tracking backends that can be selected in settings.py
+CONVERSATION_BACKENDS = {
+    "firestore": FireConn,
+    "sqlite": SQLiteConn,
+    "memory": MemoryConn,
+}
+
+conv_handler = CONVERSATION_BACKENDS[settings.CONVERSATION_BACKEND](initial_state)
+
+
+# Start tracking the conversations of all judges in the judging channels
+# This looks up every judge's initial state with a single query, so that their first interaction does not have to
+def warm_up_conversations():
+    states = {
+        judge_id: CONVERSATION_END if scored else INITIAL_STATE
+        for judge_id, scored in db.get_score_existence_by_judge().items()
+    }
+
+    return conv_handler.seed(settings.JUDGING_CHANNEL_IDS, states)
+
+
+# Only one worker sweeps the conversations that the workers share (one per machine for the "sqlite" backend, whose file is local)
+# The "memory" backend is not shared, so every worker sweeps its own conversations
+SWEEPER_LOCKS = {
+    "firestore": "sutdwth_sweeper",
+    "sqlite": f"sutdwth_sweeper_{socket.gethostname()}",
+}
+
+sweeper_lock = (
+    LeaderLock(SWEEPER_LOCKS[settings.CONVERSATION_BACKEND])
+    if settings.CONVERSATION_BACKEND in SWEEPER_LOCKS
+    else None
+)
+
+
+# Delete idle conversations and reset abandoned judging and editing processes
+# Returns the number of expired and reset conversations, or None if another worker is sweeping them
+def sweep_conversations():
+    if (sweeper_lock is not None) and not sweeper_lock.acquire():
+        return None
+
+    now = time.time()
+
+    return conv_handler.sweep(
+        now - settings.CONVERSATION_TTL,
+        now - settings.CONVERSATION_ABANDONED_TTL,
+        (TEAM_CHOOSE, TEAM_SCORE, EDIT_TEAM, EDIT_SCORE),
+    )
+
+
+# Awaitable API on the same conversations for async handlers
+async_conv_handler: AsyncConversationBackend
+if settings.CONVERSATION_BACKEND == "firestore":
+    async_conv_handler = AsyncFireConn(conv_handler)
+else:
+    async_conv_handler = AsyncConversationBackend(conv_handler)
 
 fallback = handlers.utils.fallback
 
@@ -52,7 +120,14 @@ loop = asyncio.get_event_loop()
 # Set Slack's WebClient loop to uvloop to prevent it from managing its own event loop and causing a RuntimeError
 # For more information: https://github.com/slackapi/python-slackclient/issues/429
 # Remember to preserve original reference to this config's main symbol table
-web_client = slack.WebClient(token=slack_bot_token, loop=loop, run_async=True)
+# All Web API calls go through the outbound gateway, which queues them within Slack's rate limits and retries rate-limited calls
+# Its methods return tasks that async handlers can await to get the response (or catch the SlackApiError)
+web_client = SlackGateway(
+    slack.WebClient(token=slack_bot_token, loop=loop, run_async=True)
+)
+
+# Channel names and IDs of the workspace, so that channel checks do not need any Web API calls
+channels = ChannelDirectory(web_client)
 
 
 # Log errors
@@ -0,0 +1,389 @@
+# coding: utf-8
+# Storage backends for tracking the judging conversations of each user in each channel
+# All backends share the same API, so that the handlers do not depend on where the conversations are stored
+# The Firestore backend lives in firebaser.py
+
+# Import libraries
+import asyncio
+import json
+import threading
+import time
+
+import settings
+
+from databases.sqlitehelper import LocalSQLite
+
+
+class ConversationBackend:
+    # initial_state(user_id) returns the state that a conversation which is not tracked yet starts in
+    def __init__(self, initial_state):
+        self.initial_state = initial_state
+
+    # Primitives to be implemented by every backend
+
+    # Return the user's conversation record (with the "state", "timestamp", "remark" and "updated_at" fields) as a dictionary, which is empty if it is not tracked yet
+    def read(self, channel_id, user_id):
+        raise NotImplementedError
+
+    # Update the given fields of the user's conversation record (along with the time of the update)
+    def write(self, channel_id, user_id, fields):
+        raise NotImplementedError
+
+    # Atomically move the user's conversation to the new state (and optionally store the message timestamp, or clear it along with the remark context)
+    # This only happens if the current state is one of the expected states, and returns whether the transition was made
+    def transition(
+        self, channel_id, user_id, expected_states, new_state, ts=None, clear_remark=False
+    ):
+        raise NotImplementedError
+
+    # Start tracking the conversations of the given users (mapped to their initial states) in each of the given channels
+    # Conversations that are already tracked are left as they are, and the number of newly tracked conversations is returned
+    def seed(self, channel_ids, states):
+        raise NotImplementedError
+
+    # Stop tracking the conversations that have not been updated since expire_before
+    # Conversations that have been stuck in one of the abandoned states since abandoned_before are reset to their initial state
+    # Returns the number of expired and reset conversations
+    def sweep(self, expire_before, abandoned_before, abandoned_states):
+        raise NotImplementedError
+
+    # Shared functions
+
+    def current_state(self, record, user_id):
+        state = record.get("state")
+        return self.initial_state(user_id) if state is None else state
+
+    def get_state(self, channel_id, user_id):
+        state = self.read(channel_id, user_id).get("state")
+
+        if state is None:
+            state = self.initial_state(user_id)
+            self.write(channel_id, user_id, {"state": state})
+
+        return state
+
+    def change_state(self, channel_id, user_id, state):
+        self.write(channel_id, user_id, {"state": state})
+
+    # Give the conversation back once the judging or editing process is cancelled or fails
+    def release(self, channel_id, user_id):
+        self.change_state(channel_id, user_id, self.initial_state(user_id))
+
+    def get_ts(self, channel_id, user_id):
+        return self.read(channel_id, user_id).get("timestamp")
+
+    def change_ts(self, channel_id, user_id, ts):
+        self.write(channel_id, user_id, {"timestamp": ts})
+
+    def change_state_ts(self, channel_id, user_id, state, ts):
+        self.write(channel_id, user_id, {"state": state, "timestamp": ts})
+
+    # The remark context is what the remark thread started at the timestamp is about (such as the group and the scored categories)
+    def get_remark(self, channel_id, user_id):
+        return self.read(channel_id, user_id).get("remark")
+
+    def change_ts_remark(self, channel_id, user_id, ts, remark):
+        self.write(channel_id, user_id, {"timestamp": ts, "remark": remark})
+
+    # Record the time of the update, which the sweeper uses to find idle conversations
+    @staticmethod
+    def stamped(fields):
+        return {**fields, "updated_at": time.time()}
+
+    @classmethod
+    def transition_fields(cls, new_state, ts, clear_remark=False):
+        fields = {"state": new_state}
+        if clear_remark:
+            fields.update({"timestamp": None, "remark": None})
+        if ts is not None:
+            fields["timestamp"] = ts
+
+        return cls.stamped(fields)
+
+
+# Keeps the conversations in the memory of the current process
+# Since every worker has its own copy, this is only suitable for development and load testing with a single worker
+class MemoryConn(ConversationBackend):
+    def __init__(self, initial_state):
+        super().__init__(initial_state)
+        self.records = {}
+        self.lock = threading.Lock()
+
+    def read(self, channel_id, user_id):
+        with self.lock:
+            return dict(self.records.get((str(channel_id), str(user_id)), {}))
+
+    def write(self, channel_id, user_id, fields):
+        with self.lock:
+            self.records.setdefault((str(channel_id), str(user_id)), {}).update(
+                self.stamped(fields)
+            )
+
+    def transition(
+        self, channel_id, user_id, expected_states, new_state, ts=None, clear_remark=False
+    ):
+        with self.lock:
+            record = self.records.setdefault((str(channel_id), str(user_id)), {})
+
+            if self.current_state(record, user_id) not in expected_states:
+                return False
+
+            record.update(self.transition_fields(new_state, ts, clear_remark))
+            return True
+
+    def seed(self, channel_ids, states):
+        seeded = 0
+
+        with self.lock:
+            for channel_id in channel_ids:
+                for user_id, state in states.items():
+                    key = (str(channel_id), str(user_id))
+                    if key not in self.records:
+                        self.records[key] = self.stamped({"state": state})
+                        seeded += 1
+
+        return seeded
+
+    def sweep(self, expire_before, abandoned_before, abandoned_states):
+        expired = 0
+        reset = 0
+
+        with self.lock:
+            for key, record in list(self.records.items()):
+                if record.get("updated_at", 0) < expire_before:
+                    del self.records[key]
+                    expired += 1
+
+                elif (record.get("updated_at", 0) < abandoned_before) and (
+                    record.get("state") in abandoned_states
+                ):
+                    record.update(self.stamped({"state": self.initial_state(key[1])}))
+                    reset += 1
+
+        return expired, reset
+
+
+# Keeps the conversations in a local SQLite database in WAL mode, which is shared by all workers on the same machine
+class SQLiteConn(ConversationBackend):
+    # Columns of the conversation table that can be written to
+    FIELDS = ("state", "timestamp", "remark", "updated_at")
+
+    # Columns that hold dictionaries, which are stored as JSON
+    JSON_FIELDS = ("remark",)
+
+    def __init__(self, initial_state, path=settings.CONVERSATION_SQLITE_PATH):
+        super().__init__(initial_state)
+        self.path = path
+        self.database = LocalSQLite(path)
+
+        connection = self.connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS conversation ("
+            "channel_id TEXT NOT NULL, "
+            "user_id TEXT NOT NULL, "
+            "state INTEGER, "
+            "timestamp TEXT, "
+            "remark TEXT, "
+            "updated_at REAL, "
+            "PRIMARY KEY (channel_id, user_id))"
+        )
+
+        # Conversation files created before the sweeper was added do not have the update times yet
+        columns = [row["name"] for row in connection.execute("PRAGMA table_info(conversation)")]
+        if "updated_at" not in columns:
+            connection.execute("ALTER TABLE conversation ADD COLUMN updated_at REAL")
+            connection.execute(
+                "UPDATE conversation SET updated_at = ?", (time.time(),)
+            )
+        if "remark" not in columns:
+            connection.execute("ALTER TABLE conversation ADD COLUMN remark TEXT")
+
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS ix_conversation_updated_at ON conversation (updated_at)"
+        )
+
+    def connection(self):
+        return self.database.connection()
+
+    def read(self, channel_id, user_id):
+        row = (
+            self.connection()
+            .execute(
+                "SELECT state, timestamp, remark, updated_at FROM conversation WHERE channel_id = ? AND user_id = ?",
+                (str(channel_id), str(user_id)),
+            )
+            .fetchone()
+        )
+
+        if not row:
+            return {}
+
+        return {
+            key: json.loads(row[key]) if key in self.JSON_FIELDS else row[key]
+            for key in row.keys()
+            if row[key] is not None
+        }
+
+    def upsert(self, connection, channel_id, user_id, fields):
+        columns = [column for column in self.FIELDS if column in fields]
+
+        connection.execute(
+            f"INSERT INTO conversation (channel_id, user_id, {', '.join(columns)}) "
+            f"VALUES (?, ?, {', '.join('?' for _ in columns)}) "
+            f"ON CONFLICT (channel_id, user_id) DO UPDATE SET "
+            f"{', '.join(f'{column} = excluded.{column}' for column in columns)}",
+            (
+                str(channel_id),
+                str(user_id),
+                *(
+                    json.dumps(fields[column])
+                    if column in self.JSON_FIELDS and fields[column] is not None
+                    else fields[column]
+                    for column in columns
+                ),
+            ),
+        )
+
+    def write(self, channel_id, user_id, fields):
+        self.upsert(self.connection(), channel_id, user_id, self.stamped(fields))
+
+    def transition(
+        self, channel_id, user_id, expected_states, new_state, ts=None, clear_remark=False
+    ):
+        connection = self.connection()
+
+        # Take the write lock before reading, so that concurrent transitions from other workers are serialized
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            record = self.read(channel_id, user_id)
+
+            if self.current_state(record, user_id) not in expected_states:
+                connection.execute("COMMIT")
+                return False
+
+            self.upsert(
+                connection,
+                channel_id,
+                user_id,
+                self.transition_fields(new_state, ts, clear_remark),
+            )
+            connection.execute("COMMIT")
+            return True
+
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def seed(self, channel_ids, states):
+        connection = self.connection()
+        changes = connection.total_changes
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(
+                "INSERT INTO conversation (channel_id, user_id, state, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (channel_id, user_id) DO NOTHING",
+                [
+                    (str(channel_id), str(user_id), state, time.time())
+                    for channel_id in channel_ids
+                    for user_id, state in states.items()
+                ],
+            )
+            connection.execute("COMMIT")
+
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        return connection.total_changes - changes
+
+    def sweep(self, expire_before, abandoned_before, abandoned_states):
+        connection = self.connection()
+
+        expired = connection.execute(
+            "DELETE FROM conversation WHERE updated_at < ?", (expire_before,)
+        ).rowcount
+
+        abandoned = connection.execute(
+            f"SELECT channel_id, user_id, state, updated_at FROM conversation "
+            f"WHERE updated_at < ? AND state IN ({', '.join('?' for _ in abandoned_states)})",
+            (abandoned_before, *abandoned_states),
+        ).fetchall()
+
+        # Only reset the conversations that have not moved on in the meantime
+        reset = 0
+        for row in abandoned:
+            reset += connection.execute(
+                "UPDATE conversation SET state = ?, updated_at = ? "
+                "WHERE channel_id = ? AND user_id = ? AND state = ? AND updated_at = ?",
+                (
+                    self.initial_state(row["user_id"]),
+                    time.time(),
+                    row["channel_id"],
+                    row["user_id"],
+                    row["state"],
+                    row["updated_at"],
+                ),
+            ).rowcount
+
+        return expired, reset
+
+
+# Awaitable version of the API for the async handlers
+# By default, this calls the given backend directly, which is fine for the local backends since they do not wait on the network
+# Backends that do (such as Firestore) override the primitives with native async implementations
+class AsyncConversationBackend:
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def read(self, channel_id, user_id):
+        return self.backend.read(channel_id, user_id)
+
+    async def write(self, channel_id, user_id, fields):
+        self.backend.write(channel_id, user_id, fields)
+
+    async def transition(
+        self, channel_id, user_id, expected_states, new_state, ts=None, clear_remark=False
+    ):
+        return self.backend.transition(
+            channel_id, user_id, expected_states, new_state, ts, clear_remark
+        )
+
+    # The initial state is looked up in the SQL database, so it is run in a thread to avoid blocking the event loop
+    async def initial_state(self, user_id):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.backend.initial_state, user_id)
+
+    async def current_state(self, record, user_id):
+        state = record.get("state")
+        return await self.initial_state(user_id) if state is None else state
+
+    async def get_state(self, channel_id, user_id):
+        state = (await self.read(channel_id, user_id)).get("state")
+
+        if state is None:
+            state = await self.initial_state(user_id)
+            await self.write(channel_id, user_id, {"state": state})
+
+        return state
+
+    async def change_state(self, channel_id, user_id, state):
+        await self.write(channel_id, user_id, {"state": state})
+
+    async def release(self, channel_id, user_id):
+        await self.change_state(channel_id, user_id, await self.initial_state(user_id))
+
+    async def get_ts(self, channel_id, user_id):
+        return (await self.read(channel_id, user_id)).get("timestamp")
+
+    async def change_ts(self, channel_id, user_id, ts):
+        await self.write(channel_id, user_id, {"timestamp": ts})
+
+    async def change_state_ts(self, channel_id, user_id, state, ts):
+        await self.write(channel_id, user_id, {"state": state, "timestamp": ts})
+
+    async def get_remark(self, channel_id, user_id):
+        return (await self.read(channel_id, user_id)).get("remark")
+
+    async def change_ts_remark(self, channel_id, user_id, ts, remark):
+        await self.write(channel_id, user_id, {"timestamp": ts, "remark": remark})
@@ -4,8 +4,11 @@
 
 # Import libraries
 import sqlalchemy
-from sqlalchemy import Column, DateTime, String, Text, DDL, event, and_
+from sqlalchemy import Column, DateTime, String, Text, event, and_
+from sqlalchemy import Index, UniqueConstraint, bindparam, exists, text
 from sqlalchemy.dialects.mysql import INTEGER, TINYINT, VARCHAR
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql.functions import sum, coalesce
 from sqlalchemy.sql import select
@@ -13,15 +16,25 @@ from sqlalchemy.sql.expression import func
 
 # Set up a thread-safe scoped session
 from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.orm import Session as BaseSession
+from sqlalchemy.pool import QueuePool
 
 import settings
-import decimal
-import datetime
-import json
-import ast
-import statistics
-from itertools import groupby
+import abc
+import asyncio
+import collections
+import functools
+import logging
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, groupby
 from operator import itemgetter
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
 
 # Define percentages of the four criterias
 CRIT_1 = settings.PERCENTAGES[0]
@@ -29,18 +42,253 @@ CRIT_2 = settings.PERCENTAGES[1]
 CRIT_3 = settings.PERCENTAGES[2]
 CRIT_4 = settings.PERCENTAGES[3]
 
+# Columns of the score aggregate table that are incremented by score deltas
+AGGREGATE_COLUMNS = (
+    "criteria_1_sum",
+    "criteria_2_sum",
+    "criteria_3_sum",
+    "criteria_4_sum",
+    "judge_count",
+)
+
+
+# Single leaderboard row of a category
+class LeaderboardEntry(NamedTuple):
+    group_name: str
+    score: float
+
+
+# Snapshot of a table that is loaded in bulk with a single query and reloaded once it is older than its TTL
+# Subclasses keep the loaded rows in their own lookup structures
+class TimedCache(abc.ABC):
+    def __init__(self, loader, ttl):
+        self.loader = loader
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.loaded_at = None
+        self.invalidations = 0
+
+    def invalidate(self):
+        self.invalidations += 1
+        self.loaded_at = None
+
+    # Keep the rows returned by the loader
+    @abc.abstractmethod
+    def store(self, rows):
+        pass
+
+    def refresh(self):
+        with self.lock:
+            invalidations = self.invalidations
+            self.store(self.loader())
+
+            # Rows committed while the loader was running might be missing, so the cache stays stale in that case
+            if self.invalidations == invalidations:
+                self.loaded_at = time.monotonic()
+
+    def is_stale(self):
+        return (self.loaded_at is None) or (
+            time.monotonic() - self.loaded_at > self.ttl
+        )
+
+
+# In-process identity map for name <-> UUID translations of a table
+# The whole mapping is reloaded once on a cache miss
+# since rows might have been inserted by other processes (such as the OComm backend)
+class LookupCache(TimedCache):
+    def __init__(self, loader, ttl=settings.LOOKUP_CACHE_TTL):
+        super().__init__(loader, ttl)
+        self.ids_by_name = {}
+        self.names_by_id = {}
+
+    def store(self, rows):
+        self.ids_by_name = {name: row_id for row_id, name in rows}
+        self.names_by_id = {row_id: name for row_id, name in rows}
+
+    def lookup(self, mapping_name, key):
+        if self.is_stale():
+            self.refresh()
+
+        mapping = getattr(self, mapping_name)
+        if key not in mapping:
+            self.refresh()
+            mapping = getattr(self, mapping_name)
+
+        # Raise an IndexError if the row really does not exist, like the single-row queries that this cache replaced
+        if key not in mapping:
+            raise IndexError(f"No row found for {key!r}")
+
+        return mapping[key]
+
+    def get_id(self, name):
+        return self.lookup("ids_by_name", name)
+
+    def get_name(self, row_id):
+        return self.lookup("names_by_id", row_id)
+
+
+# In-process set of judge IDs for authorization checks on the hot path
+# Membership tests do not hit the database unless the roster is older than its TTL
+class RosterCache(TimedCache):
+    def __init__(self, loader, ttl=settings.JUDGE_ROSTER_TTL):
+        super().__init__(loader, ttl)
+        self.members = frozenset()
+
+    def store(self, rows):
+        self.members = frozenset(judge_id for judge_id, in rows)
+
+    def __contains__(self, user_id):
+        if self.is_stale():
+            self.refresh()
+
+        return user_id in self.members
+
+
+# Per-process statistics of how long connection pool checkouts had to wait for a free connection
+# Use these to size the pool against the observed concurrency
+class PoolMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.checkouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+            self.slow_checkouts = 0
+
+    def record(self, wait):
+        with self.lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            if wait > settings.DB_POOL_SLOW_CHECKOUT:
+                self.slow_checkouts += 1
+
+        if wait > settings.DB_POOL_SLOW_CHECKOUT:
+            logger.warning(
+                f"Waited {wait:.3f}s for a database connection, consider increasing DB_POOL_SIZE or DB_MAX_OVERFLOW."
+            )
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "checkouts": self.checkouts,
+                "average_wait": self.total_wait / self.checkouts
+                if self.checkouts
+                else 0.0,
+                "max_wait": self.max_wait,
+                "slow_checkouts": self.slow_checkouts,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+# Queue pool that times how long each checkout waits for a connection
+class TimedQueuePool(QueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_metrics.record(time.perf_counter() - start)
+
+
+# Sessions look the engine up lazily so that each process (such as each forked gunicorn worker) uses its own engine
+class ForkSafeSession(BaseSession):
+    def get_bind(self, *args, **kwargs):
+        return DBHelper.get_engine()
+
+
+# Named MySQL lock that elects a single process (across all workers and machines) to run a periodic job
+# The winner keeps the lock on a connection of its own for as long as it lives, and MySQL releases it if the process dies,
+# so that another process takes over on its next attempt
+# Other databases (such as SQLite in development) do not support named locks, so every process is elected there
+class LeaderLock:
+    def __init__(self, name):
+        self.name = name
+        self.connection = None
+
+    # Return whether this process holds the lock, trying to take it over if it does not
+    def acquire(self):
+        engine = DBHelper.get_engine()
+        if engine.dialect.name != "mysql":
+            return True
+
+        if self.connection is not None:
+            try:
+                # This also keeps the connection from being closed by the server for being idle
+                if self.connection.execute(
+                    text("SELECT IS_USED_LOCK(:name) = CONNECTION_ID()"),
+                    {"name": self.name},
+                ).scalar():
+                    return True
+            except sqlalchemy.exc.SQLAlchemyError as e:
+                logger.warning(f"Lost the connection holding the lock {self.name}: {e}")
+
+            self.release()
+
+        connection = engine.connect()
+        if connection.execute(
+            text("SELECT GET_LOCK(:name, 0)"), {"name": self.name}
+        ).scalar():
+            self.connection = connection
+            return True
+
+        connection.close()
+        return False
+
+    def release(self):
+        if self.connection is None:
+            return
+
+        try:
+            self.connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": self.name})
+        except sqlalchemy.exc.SQLAlchemyError:
+            pass
+        finally:
+            self.connection.close()
+            self.connection = None
+
+
+# Caches of the DBHelper instances by the name of the table that they are loaded from
+table_caches = collections.defaultdict(weakref.WeakSet)
 
-# JSON encoder function for SQLAlchemy special classes
-def alchemyencoder(obj):
-    if isinstance(obj, datetime.date):
-        return obj.isoformat()
-    elif isinstance(obj, decimal.Decimal):
-        return float(obj)
+
+def watch_table(table_name, cache):
+    table_caches[table_name].add(cache)
+
+
+# The caches are only invalidated once the changes are committed, since a refresh in between would load the old rows again
+# Changes are flagged at flush time, which is when the ORM knows which tables they touch
+@event.listens_for(ForkSafeSession, "after_flush")
+def flag_changed_tables(session, flush_context):
+    changed_tables = session.info.setdefault("changed_tables", set())
+
+    for instance in chain(session.new, session.dirty, session.deleted):
+        changed_tables.add(instance.__tablename__)
+
+
+@event.listens_for(ForkSafeSession, "after_commit")
+def invalidate_changed_tables(session):
+    for table_name in session.info.pop("changed_tables", ()):
+        for cache in list(table_caches[table_name]):
+            cache.invalidate()
+
+
+@event.listens_for(ForkSafeSession, "after_rollback")
+def forget_changed_tables(session):
+    session.info.pop("changed_tables", None)
 
 
 # Main database class (SQLAlchemy ORM implementation is resistant to SQL injection)
 class DBHelper:
-    engine = sqlalchemy.create_engine(settings.DB_URL)
+    # The engine is created on first use instead of at import time, see get_engine()
+    engine = None
+    engine_pid = None
+    engine_lock = threading.Lock()
     Base = declarative_base()
     metadata = Base.metadata
 
@@ -64,6 +312,10 @@ class DBHelper:
 
     class CategoryGroup(Base):
         __tablename__ = "category_group"
+        __table_args__ = (
+            UniqueConstraint("group_id", "category_id", name="uq_category_group"),
+            Index("ix_category_group_category_id", "category_id"),
+        )
 
         category_group_id = Column(
             VARCHAR(36), primary_key=True, nullable=False, default=func.uuid()
@@ -76,6 +328,9 @@ class DBHelper:
 
     class CategoryJudge(Base):
         __tablename__ = "category_judge"
+        __table_args__ = (
+            UniqueConstraint("judge_id", "category_id", name="uq_category_judge"),
+        )
 
         category_judge_id = Column(
             VARCHAR(36), primary_key=True, nullable=False, default=func.uuid()
@@ -88,6 +343,12 @@ class DBHelper:
 
     class CategoryParticipant(Base):
         __tablename__ = "category_participant"
+        __table_args__ = (
+            UniqueConstraint(
+                "participant_id", "category_id", name="uq_category_participant"
+            ),
+            Index("ix_category_participant_category_id", "category_id"),
+        )
 
         category_participant_id = Column(
             VARCHAR(36), primary_key=True, nullable=False, default=func.uuid()
@@ -100,11 +361,12 @@ class DBHelper:
 
     class CompetitionCategory(Base):
         __tablename__ = "competition_category"
+        __table_args__ = (UniqueConstraint("name", name="uq_competition_category_name"),)
 
         category_id = Column(
             VARCHAR(36), primary_key=True, nullable=False, default=func.uuid()
         )
-        name = Column(Text, nullable=False)
+        name = Column(VARCHAR(255), nullable=False)
 
         def __repr__(self):
             return f"<Category ID: {self.category_id}>"
@@ -126,6 +388,9 @@ class DBHelper:
 
     class ConsumableGroup(Base):
         __tablename__ = "consumable_group"
+        __table_args__ = (
+            UniqueConstraint("group_id", "consumable_id", name="uq_consumable_group"),
+        )
 
         consumable_group_id = Column(
             VARCHAR(36), primary_key=True, nullable=False, default=func.uuid()
@@ -139,11 +404,13 @@ class DBHelper:
 
     class Group(Base):
         __tablename__ = "group"
+        __table_args__ = (UniqueConstraint("name", name="uq_group_name"),)
 
         group_id = Column(
             VARCHAR(36), primary_key=True, nullable=False, default=func.uuid()
         )
-        name = Column(Text, nullable=False)
+        # Names are looked up by equality, so they are stored as indexable VARCHARs (which TEXT columns are not)
+        name = Column(VARCHAR(255), nullable=False)
         group_leader_id = Column(VARCHAR(36), nullable=False)
         space = Column(Text)
         submission_url = Column(VARCHAR(2083))
@@ -155,6 +422,10 @@ class DBHelper:
 
     class Loan(Base):
         __tablename__ = "loan"
+        __table_args__ = (
+            Index("ix_loan_tool_id", "tool_id"),
+            Index("ix_loan_loan_to_group_id", "loan_to_group_id"),
+        )
 
         loan_id = Column(
             VARCHAR(36), primary_key=True, nullable=False, default=func.uuid()
@@ -168,6 +439,14 @@ class DBHelper:
 
     class Score(Base):
         __tablename__ = "score"
+        # A judge can only submit one score per group per category
+        # This unique key also serves lookups by judge_id and (judge_id, group_id) as its leftmost prefixes
+        __table_args__ = (
+            UniqueConstraint(
+                "judge_id", "group_id", "category_id", name="uq_score_judge_group_category"
+            ),
+            Index("ix_score_group_id_category_id", "group_id", "category_id"),
+        )
 
         score_id = Column(
             VARCHAR(36), primary_key=True, nullable=False, default=func.uuid()
@@ -185,6 +464,22 @@ class DBHelper:
         def __repr__(self):
             return f"<Score ID: {self.score_id}>"
 
+    # Running criteria score sums and judge counts per (group, category) pair
+    # This is maintained together with the Score table so that leaderboards do not need to re-aggregate all scores
+    class ScoreAggregate(Base):
+        __tablename__ = "score_aggregate"
+
+        group_id = Column(VARCHAR(36), primary_key=True, nullable=False)
+        category_id = Column(VARCHAR(36), primary_key=True, nullable=False)
+        criteria_1_sum = Column(INTEGER(11), nullable=False, default=0)
+        criteria_2_sum = Column(INTEGER(11), nullable=False, default=0)
+        criteria_3_sum = Column(INTEGER(11), nullable=False, default=0)
+        criteria_4_sum = Column(INTEGER(11), nullable=False, default=0)
+        judge_count = Column(INTEGER(11), nullable=False, default=0)
+
+        def __repr__(self):
+            return f"<Score Aggregate: {self.group_id}, {self.category_id}>"
+
     class Tool(Base):
         __tablename__ = "tool"
 
@@ -357,169 +652,99 @@ class DBHelper:
         def __repr__(self):
             return f"<Participant Preference Workshops Participant ID: {self.workshops_participant_id}>"
 
-    # Define triggers
-    event.listen(
-        CategoryGroup.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.%(table)s_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    event.listen(
-        CategoryJudge.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.%(table)s_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    event.listen(
-        CategoryParticipant.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.%(table)s_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    event.listen(
-        CompetitionCategory.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.category_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    event.listen(
-        Consumable.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.%(table)s_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    event.listen(
-        ConsumableGroup.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.%(table)s_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    # This is a special hacky workaround since "group" is a reserved keyword in PyMySQL
-    event.listen(
-        Group.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER group_trigger BEFORE INSERT ON `group` FOR EACH ROW SET NEW.group_id = UUID(), NEW.hack_submitted = 0, NEW.utensils_returned = 0;"""
-        ).execute_if(dialect="mysql"),
-    )
-    event.listen(
-        Loan.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.%(table)s_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    event.listen(
-        Score.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.%(table)s_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    event.listen(
-        Tool.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.%(table)s_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    event.listen(
-        Participant.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.%(table)s_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    # Different column names compared to table names
-    event.listen(
-        ParticipantOrganisation.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.organisation_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    event.listen(
-        ParticipantNextOfKin.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.NoK_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    event.listen(
-        ParticipantPreferenceTechnologyofInterest.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.technology_of_interest_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    event.listen(
-        ParticipantPreferenceTechnologyofInterestParticipant.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.technology_of_interest_participant_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    event.listen(
-        ParticipantPreferenceSkills.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.skills_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    event.listen(
-        ParticipantPreferenceSkillsParticipant.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.skills_participant_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    event.listen(
-        ParticipantPreferenceUtensilName.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.utensil_name_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    event.listen(
-        ParticipantPreferenceUtensilNameParticipant.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.utensil_name_participant_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    event.listen(
-        ParticipantPreferenceWorkshops.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.workshops_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-    event.listen(
-        ParticipantPreferenceWorkshopsParticipant.__table__,
-        "after_create",
-        DDL(
-            """CREATE TRIGGER %(table)s_trigger BEFORE INSERT ON %(table)s FOR EACH ROW SET NEW.workshops_participant_id = UUID();"""
-        ).execute_if(dialect="mysql"),
-    )
-
-    # Create the model in the SQL database if the tables do not exist yet (conditional by default)
-    metadata.create_all(engine)
+    # UUID triggers, along with the tables themselves, are created by migrations.py
 
     # Initiate session factory
-    session_factory = sessionmaker(bind=engine)
+    session_factory = sessionmaker(class_=ForkSafeSession)
 
     # All calls to Session() will create a thread-local session
     # Remember to call .remove() on Session, not session
     Session = scoped_session(session_factory)
 
+    # No DDL is issued here, run migrate.py to create or upgrade the schema
+    def __init__(self):
+        self.group_lookup = LookupCache(self.load_group_names)
+        self.category_lookup = LookupCache(self.load_category_names)
+        self.judge_roster = RosterCache(self.load_judge_ids)
+
+        # Drop the cached rows whenever groups, categories or judges are inserted, renamed or deleted through the ORM
+        watch_table(self.Group.__tablename__, self.group_lookup)
+        watch_table(self.CompetitionCategory.__tablename__, self.category_lookup)
+        watch_table(self.Judge.__tablename__, self.judge_roster)
+
+    # Return the engine of the current process, creating it on first use
+    # Pooled connections must not be shared across a fork, so a forked process discards the engine inherited from its parent
+    @classmethod
+    def get_engine(cls):
+        if cls.engine_pid != os.getpid():
+            with cls.engine_lock:
+                if cls.engine_pid != os.getpid():
+                    if cls.engine is not None:
+                        # Leave the connections that still belong to the parent process untouched
+                        cls.engine.dispose(close=False)
+
+                    cls.engine = sqlalchemy.create_engine(
+                        settings.DB_URL,
+                        poolclass=TimedQueuePool,
+                        pool_size=settings.DB_POOL_SIZE,
+                        max_overflow=settings.DB_MAX_OVERFLOW,
+                        pool_timeout=settings.DB_POOL_TIMEOUT,
+                        pool_recycle=settings.DB_POOL_RECYCLE,
+                        pool_pre_ping=settings.DB_POOL_PRE_PING,
+                    )
+                    cls.engine_pid = os.getpid()
+                    pool_metrics.reset()
+
+        return cls.engine
+
+    # Report the connection pool usage and checkout wait times of the current process
+    @classmethod
+    def get_pool_stats(cls):
+        pool = cls.get_engine().pool
+
+        return {
+            "pid": os.getpid(),
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            **pool_metrics.snapshot(),
+        }
+
     # Define helper functions
 
+    # Bulk loaders for the lookup caches
+    # These use their own session so that they do not close the scoped session of a caller midway
+    def load_group_names(self):
+        session = self.session_factory()
+
+        try:
+            return session.query(self.Group.group_id, self.Group.name).all()
+        finally:
+            session.close()
+
+    def load_category_names(self):
+        session = self.session_factory()
+
+        try:
+            return session.query(
+                self.CompetitionCategory.category_id, self.CompetitionCategory.name
+            ).all()
+        finally:
+            session.close()
+
+    def load_judge_ids(self):
+        session = self.session_factory()
+
+        try:
+            return session.query(self.Judge.judge_id).all()
+        finally:
+            session.close()
+
+    # Use this after modifying groups or categories with bulk or raw SQL queries (which do not emit ORM events)
+    def invalidate_lookups(self):
+        self.group_lookup.invalidate()
+        self.category_lookup.invalidate()
+
     def get_all_categories(self):
         session = self.Session()
 
@@ -554,55 +779,21 @@ class DBHelper:
 
         return sorted([judge for sublist in judges for judge in sublist])
 
-    def get_category_id(self, category_name):
-        session = self.Session()
+    # Check whether the specified Slack user is a judge (served from the cached judge roster)
+    def is_judge(self, user_id):
+        return user_id in self.judge_roster
 
-        category = (
-            session.query(self.CompetitionCategory.category_id)
-            .filter(self.CompetitionCategory.name == category_name)
-            .all()
-        )
-
-        self.Session.remove()
-
-        return category[0][0]
+    def get_category_id(self, category_name):
+        return self.category_lookup.get_id(category_name)
 
     def get_category_name(self, category_id):
-        session = self.Session()
-
-        category = (
-            session.query(self.CompetitionCategory.name)
-            .filter(self.CompetitionCategory.category_id == category_id)
-            .all()
-        )
-
-        self.Session.remove()
-
-        return category[0][0]
+        return self.category_lookup.get_name(category_id)
 
     def get_group_id(self, group_name):
-        session = self.Session()
-
-        group = (
-            session.query(self.Group.group_id)
-            .filter(self.Group.name == group_name)
-            .all()
-        )
-
-        self.Session.remove()
-
-        return group[0][0]
+        return self.group_lookup.get_id(group_name)
 
     def get_group_name(self, group_id):
-        session = self.Session()
-
-        group = (
-            session.query(self.Group.name).filter(self.Group.group_id == group_id).all()
-        )
-
-        self.Session.remove()
-
-        return group[0][0]
+        return self.group_lookup.get_name(group_id)
 
     def add_judge(self, user_id, name):
         session = self.Session()
@@ -624,6 +815,30 @@ class DBHelper:
 
         self.Session.remove()
 
+    # Remove a judge along with their category assignments (their submitted scores are kept)
+    def delete_judge(self, user_id):
+        session = self.Session()
+
+        try:
+            session.query(self.CategoryJudge).filter(
+                self.CategoryJudge.judge_id == user_id
+            ).delete(synchronize_session=False)
+            session.query(self.Judge).filter(self.Judge.judge_id == user_id).delete(
+                synchronize_session=False
+            )
+            session.commit()
+        # This is important for modification queries
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+        self.Session.remove()
+
+        # Bulk deletions do not emit ORM events
+        self.judge_roster.invalidate()
+
     def add_judge_category(self, user_id, category_name):
         session = self.Session()
 
@@ -647,122 +862,93 @@ class DBHelper:
 
         self.Session.remove()
 
-    def build_leaderboard(self, category_name):
+    # Compute the leaderboards of all categories at once (weighted averages and top-K ranking are done by MySQL)
+    # This only reads the score aggregate table, which has one row per (group, category) pair
+    # Window functions require MySQL 8.0 or later
+    def build_all_leaderboards(
+        self, limit=settings.MAX_LEADERBOARD_ENTRIES_PER_CATEGORY_LIMIT
+    ):
         session = self.Session()
 
-        # Prepare category_id
-        category_id = self.get_category_id(category_name)
+        weighted_score = (
+            (CRIT_1 * self.ScoreAggregate.criteria_1_sum)
+            + (CRIT_2 * self.ScoreAggregate.criteria_2_sum)
+            + (CRIT_3 * self.ScoreAggregate.criteria_3_sum)
+            + (CRIT_4 * self.ScoreAggregate.criteria_4_sum)
+        ) / self.ScoreAggregate.judge_count
 
-        # Join Group and Score tables using group_id, filter based on category_id, then select these 7 columns (as subquery)
-        score_list = (
+        # Join the ScoreAggregate, Group and CompetitionCategory tables, then rank each group within its category
+        ranking = (
             session.query(
-                self.Group.group_id,
-                self.Group.name,
-                self.Score.category_id,
-                self.Score.criteria_1_score,
-                self.Score.criteria_2_score,
-                self.Score.criteria_3_score,
-                self.Score.criteria_4_score,
+                self.CompetitionCategory.name.label("category_name"),
+                self.Group.name.label("group_name"),
+                weighted_score.label("score"),
+                func.row_number()
+                .over(
+                    partition_by=self.ScoreAggregate.category_id,
+                    order_by=(weighted_score.desc(), self.Group.name),
+                )
+                .label("position"),
             )
-            .join(self.Score, self.Group.group_id == self.Score.group_id)
-            .filter(self.Score.category_id == category_id)
+            .join(self.Group, self.Group.group_id == self.ScoreAggregate.group_id)
+            .join(
+                self.CompetitionCategory,
+                self.CompetitionCategory.category_id
+                == self.ScoreAggregate.category_id,
+            )
+            .filter(self.ScoreAggregate.judge_count > 0)
             .subquery()
         )
 
-        # Select group names and average scores as namedtuples for all criterias
         result = (
             session.query(
-                score_list.c.name,
-                func.avg(score_list.c.criteria_1_score).label("criteria_1"),
-                func.avg(score_list.c.criteria_2_score).label("criteria_2"),
-                func.avg(score_list.c.criteria_3_score).label("criteria_3"),
-                func.avg(score_list.c.criteria_4_score).label("criteria_4"),
+                ranking.c.category_name, ranking.c.group_name, ranking.c.score
             )
-            .group_by(score_list.c.name)
+            .filter(ranking.c.position <= limit)
+            .order_by(ranking.c.category_name, ranking.c.position)
             .all()
         )
 
-        # Insert percentage of each criteria here
-        actual_result = (
-            (
-                group_name,
-                (decimal.Decimal(CRIT_1) * first)
-                + (decimal.Decimal(CRIT_2) * second)
-                + (decimal.Decimal(CRIT_3) * third)
-                + (decimal.Decimal(CRIT_4) * fourth),
-            )
-            for group_name, first, second, third, fourth in result
-        )
-
-        # Sort list in descending order of score
-        final_result = sorted(actual_result, key=lambda x: x[1], reverse=True)
-
         self.Session.remove()
 
-        return json.dumps(final_result, default=alchemyencoder)
-
-    # Get all teams judgeable by the specified judge
-    def get_all_teams(self, judge_id):
-        session = self.Session()
-        temp_judge_categories = sorted(
-            session.query(self.Judge.name, self.CompetitionCategory.name)
-            .join(
-                self.CategoryJudge, self.Judge.judge_id == self.CategoryJudge.judge_id
-            )
-            .join(
-                self.CompetitionCategory,
-                self.CategoryJudge.category_id == self.CompetitionCategory.category_id,
+        # Categories without any scores are still returned (as empty lists)
+        leaderboards = {category: [] for category in settings.CATEGORIES}
+        for category_name, group_name, score in result:
+            leaderboards.setdefault(category_name, []).append(
+                LeaderboardEntry(group_name, float(score))
             )
-            .filter(self.Judge.judge_id == judge_id)
-            .all(),
-            key=lambda x: x[1],
-        )
-        # Group categories for the specified judge together in a list based on first element of tuple
-        categories = [
-            (name, [category for _, category in categories])
-            for name, categories in groupby(temp_judge_categories, itemgetter(0))
-        ]
 
-        # Check if list is empty
-        if not categories:
-            self.Session.remove()
+        return leaderboards
 
-            return []
+    # Get all teams that the specified judge can judge but has not judged yet
+    # A team is judgeable if it competes in any of the judge's categories
+    def get_pending_teams(self, judge_id):
+        session = self.Session()
 
-        else:
-            main_list = []
-            allowed_categories = sorted(categories[0][1])
-            team_list = sorted(
-                session.query(self.Group.name, self.CompetitionCategory.name)
-                .join(
-                    self.CategoryGroup,
-                    self.Group.group_id == self.CategoryGroup.group_id,
-                )
-                .join(
-                    self.CompetitionCategory,
-                    self.CategoryGroup.category_id
-                    == self.CompetitionCategory.category_id,
-                )
-                .all(),
-                key=lambda x: x[1],
+        # Anti-join against the Score table since a judge can only judge a particular team once
+        judged = exists().where(
+            and_(
+                self.Score.judge_id == judge_id,
+                self.Score.group_id == self.Group.group_id,
             )
-            # Group categories for each team together in a list based on first element of tuple
-            actual_team_list = [
-                (name, [category for _, category in categories])
-                for name, categories in groupby(team_list, itemgetter(0))
-            ]
-
-            for i in range(len(actual_team_list)):
-                name = actual_team_list[i][0]
-                category = actual_team_list[i][1]
+        )
 
-                # Check if both lists share any elements
-                if not set(allowed_categories).isdisjoint(category):
-                    main_list.append(name)
+        teams = (
+            session.query(self.Group.name)
+            .join(self.CategoryGroup, self.CategoryGroup.group_id == self.Group.group_id)
+            .join(
+                self.CategoryJudge,
+                self.CategoryJudge.category_id == self.CategoryGroup.category_id,
+            )
+            .filter(and_(self.CategoryJudge.judge_id == judge_id, ~judged))
+            .distinct()
+            .order_by(self.Group.name)
+            .all()
+        )
 
-            self.Session.remove()
+        self.Session.remove()
 
-            return sorted(main_list)
+        return [team for sublist in teams for team in sublist]
 
     # Get a list of the categories of a specific team to be judged
     def get_categories(self, judge_id, group_name):
@@ -816,6 +1002,48 @@ class DBHelper:
 
         return categories
 
+    # Add score deltas to the score aggregate table as part of the transaction of the given session
+    # Each delta is a dictionary of group_id, category_id and the AGGREGATE_COLUMNS
+    # SQLite (which the tests run on) has its own upsert syntax
+    def apply_aggregate_deltas(self, session, deltas):
+        table = self.ScoreAggregate.__table__
+
+        if session.get_bind().dialect.name == "sqlite":
+            statement = sqlite_insert(table)
+            statement = statement.on_conflict_do_update(
+                index_elements=["group_id", "category_id"],
+                set_={
+                    column: table.c[column] + statement.excluded[column]
+                    for column in AGGREGATE_COLUMNS
+                },
+            )
+        else:
+            statement = mysql_insert(table)
+            statement = statement.on_duplicate_key_update(
+                {
+                    column: table.c[column] + statement.inserted[column]
+                    for column in AGGREGATE_COLUMNS
+                }
+            )
+
+        session.execute(statement, deltas)
+
+    # Calculate the aggregate delta between an old and a new set of criteria scores
+    # Use None as the old scores for an insertion and None as the new scores for a deletion
+    def build_aggregate_delta(self, group_id, category_id, old_scores, new_scores):
+        delta = {
+            "group_id": group_id,
+            "category_id": category_id,
+            "judge_count": int(new_scores is not None) - int(old_scores is not None),
+        }
+
+        old_scores = old_scores or (0, 0, 0, 0)
+        new_scores = new_scores or (0, 0, 0, 0)
+        for index, column in enumerate(AGGREGATE_COLUMNS[:4]):
+            delta[column] = new_scores[index] - old_scores[index]
+
+        return delta
+
     # Commit a score to the database
     def add_score(
         self,
@@ -827,23 +1055,58 @@ class DBHelper:
         criteria_3_score,
         criteria_4_score,
     ):
+        self.add_scores_bulk(
+            judge_id,
+            group_name,
+            {
+                category_name: (
+                    criteria_1_score,
+                    criteria_2_score,
+                    criteria_3_score,
+                    criteria_4_score,
+                )
+            },
+        )
+
+    # Commit the scores of multiple categories for a group in one transaction (either all or none of them are stored)
+    # The scores are given as a dictionary of category name to a tuple of the 4 criteria scores
+    def add_scores_bulk(self, judge_id, group_name, scores):
         session = self.Session()
 
-        # Prepare group_id and category_id
+        # Prepare group_id and category_ids
         group_id = self.get_group_id(group_name)
-        category_id = self.get_category_id(category_name)
+        category_ids = {
+            category_name: self.get_category_id(category_name)
+            for category_name in scores
+        }
+
+        score_rows = [
+            {
+                "judge_id": judge_id,
+                "group_id": group_id,
+                "category_id": category_ids[category_name],
+                "criteria_1_score": criteria_scores[0],
+                "criteria_2_score": criteria_scores[1],
+                "criteria_3_score": criteria_scores[2],
+                "criteria_4_score": criteria_scores[3],
+            }
+            for category_name, criteria_scores in scores.items()
+        ]
 
         try:
-            session.add(
-                self.Score(
-                    judge_id=judge_id,
-                    group_id=group_id,
-                    category_id=category_id,
-                    criteria_1_score=criteria_1_score,
-                    criteria_2_score=criteria_2_score,
-                    criteria_3_score=criteria_3_score,
-                    criteria_4_score=criteria_4_score,
-                )
+            # Insert all rows with a single executemany
+            session.execute(self.Score.__table__.insert(), score_rows)
+            self.apply_aggregate_deltas(
+                session,
+                [
+                    self.build_aggregate_delta(
+                        group_id,
+                        category_ids[category_name],
+                        None,
+                        tuple(criteria_scores),
+                    )
+                    for category_name, criteria_scores in scores.items()
+                ],
             )
             session.commit()
         # This is important for modification queries
@@ -884,6 +1147,109 @@ class DBHelper:
         criteria_3_score,
         criteria_4_score,
     ):
+        self.edit_scores_bulk(
+            judge_id,
+            group_name,
+            {
+                category_name: (
+                    criteria_1_score,
+                    criteria_2_score,
+                    criteria_3_score,
+                    criteria_4_score,
+                )
+            },
+        )
+
+    # Update the scores of multiple categories for a group in one transaction (either all or none of them are changed)
+    # The scores are given as a dictionary of category name to a tuple of the 4 criteria scores
+    def edit_scores_bulk(self, judge_id, group_name, scores):
+        session = self.Session()
+        score_table = self.Score.__table__
+
+        # Prepare group_id and category_ids
+        group_id = self.get_group_id(group_name)
+        category_ids = {
+            category_name: self.get_category_id(category_name)
+            for category_name in scores
+        }
+
+        try:
+            # Lock the old scores until the aggregates have been updated
+            old_scores = {
+                category_id: tuple(criteria_scores)
+                for category_id, *criteria_scores in session.query(
+                    self.Score.category_id,
+                    self.Score.criteria_1_score,
+                    self.Score.criteria_2_score,
+                    self.Score.criteria_3_score,
+                    self.Score.criteria_4_score,
+                )
+                .filter(
+                    and_(
+                        self.Score.judge_id == judge_id,
+                        self.Score.group_id == group_id,
+                        self.Score.category_id.in_(category_ids.values()),
+                    )
+                )
+                .with_for_update()
+                .all()
+            }
+
+            # Update all rows with a single executemany
+            session.execute(
+                score_table.update()
+                .where(
+                    and_(
+                        score_table.c.judge_id == bindparam("b_judge_id"),
+                        score_table.c.group_id == bindparam("b_group_id"),
+                        score_table.c.category_id == bindparam("b_category_id"),
+                    )
+                )
+                .values(
+                    criteria_1_score=bindparam("b_criteria_1_score"),
+                    criteria_2_score=bindparam("b_criteria_2_score"),
+                    criteria_3_score=bindparam("b_criteria_3_score"),
+                    criteria_4_score=bindparam("b_criteria_4_score"),
+                ),
+                [
+                    {
+                        "b_judge_id": judge_id,
+                        "b_group_id": group_id,
+                        "b_category_id": category_ids[category_name],
+                        "b_criteria_1_score": criteria_scores[0],
+                        "b_criteria_2_score": criteria_scores[1],
+                        "b_criteria_3_score": criteria_scores[2],
+                        "b_criteria_4_score": criteria_scores[3],
+                    }
+                    for category_name, criteria_scores in scores.items()
+                ],
+            )
+
+            # Only scores that actually existed have been changed
+            aggregate_deltas = [
+                self.build_aggregate_delta(
+                    group_id,
+                    category_ids[category_name],
+                    old_scores[category_ids[category_name]],
+                    tuple(criteria_scores),
+                )
+                for category_name, criteria_scores in scores.items()
+                if category_ids[category_name] in old_scores
+            ]
+            if aggregate_deltas:
+                self.apply_aggregate_deltas(session, aggregate_deltas)
+            session.commit()
+        # This is important for modification queries
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+        self.Session.remove()
+
+    # Remove a score from the database
+    def delete_score(self, judge_id, group_name, category_name):
         session = self.Session()
 
         # Prepare group_id and category_id
@@ -891,21 +1257,102 @@ class DBHelper:
         category_id = self.get_category_id(category_name)
 
         try:
-            session.query(self.Score).filter(
+            score_filter = session.query(self.Score).filter(
                 and_(
                     self.Score.judge_id == judge_id,
                     self.Score.group_id == group_id,
                     self.Score.category_id == category_id,
                 )
-            ).update(
-                {
-                    self.Score.criteria_1_score: criteria_1_score,
-                    self.Score.criteria_2_score: criteria_2_score,
-                    self.Score.criteria_3_score: criteria_3_score,
-                    self.Score.criteria_4_score: criteria_4_score,
-                },
-                synchronize_session=False,
             )
+
+            old_scores = (
+                score_filter.with_entities(
+                    self.Score.criteria_1_score,
+                    self.Score.criteria_2_score,
+                    self.Score.criteria_3_score,
+                    self.Score.criteria_4_score,
+                )
+                .with_for_update()
+                .first()
+            )
+
+            if old_scores is not None:
+                score_filter.delete(synchronize_session=False)
+                self.apply_aggregate_deltas(
+                    session,
+                    [
+                        self.build_aggregate_delta(
+                            group_id, category_id, tuple(old_scores), None
+                        )
+                    ],
+                )
+            session.commit()
+        # This is important for modification queries
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+        self.Session.remove()
+
+    # Rebuild the score aggregate table from the Score table
+    # Returns the drift found as a list of (group_name, category_name, expected, actual) tuples
+    def rebuild_score_aggregates(self):
+        session = self.Session()
+
+        expected_query = session.query(
+            self.Score.group_id,
+            self.Score.category_id,
+            sum(self.Score.criteria_1_score),
+            sum(self.Score.criteria_2_score),
+            sum(self.Score.criteria_3_score),
+            sum(self.Score.criteria_4_score),
+            func.count(self.Score.score_id),
+        ).group_by(self.Score.group_id, self.Score.category_id)
+
+        try:
+            # Lock the aggregates against concurrent score submissions for the duration of the rebuild
+            actual = {
+                (row[0], row[1]): tuple(int(value) for value in row[2:])
+                for row in session.query(
+                    self.ScoreAggregate.group_id,
+                    self.ScoreAggregate.category_id,
+                    *(
+                        getattr(self.ScoreAggregate, column)
+                        for column in AGGREGATE_COLUMNS
+                    ),
+                )
+                .with_for_update()
+                .all()
+            }
+            expected = {
+                (row[0], row[1]): tuple(int(value) for value in row[2:])
+                for row in expected_query.with_for_update(read=True).all()
+            }
+
+            # Ignore aggregates that have been emptied by score deletions
+            empty = (0,) * len(AGGREGATE_COLUMNS)
+            drift = [
+                (
+                    self.get_group_name(group_id),
+                    self.get_category_name(category_id),
+                    expected.get((group_id, category_id), empty),
+                    actual.get((group_id, category_id), empty),
+                )
+                for group_id, category_id in sorted(set(expected) | set(actual))
+                if expected.get((group_id, category_id), empty)
+                != actual.get((group_id, category_id), empty)
+            ]
+
+            if drift:
+                session.query(self.ScoreAggregate).delete(synchronize_session=False)
+                session.execute(
+                    self.ScoreAggregate.__table__.insert().from_select(
+                        ["group_id", "category_id", *AGGREGATE_COLUMNS],
+                        expected_query,
+                    )
+                )
             session.commit()
         # This is important for modification queries
         except:
@@ -916,6 +1363,8 @@ class DBHelper:
 
         self.Session.remove()
 
+        return drift
+
     # Get all scores of a specific category committed by the specified judge for editing purposes
     def get_all_scores(self, judge_id, category_name):
         session = self.Session()
@@ -946,6 +1395,35 @@ class DBHelper:
 
         return sorted(scoreboard, key=lambda x: x[0])
 
+    # Get all scores and remarks committed by the specified judge along with their category and group names, ordered by category and group
+    def get_score_summary(self, judge_id):
+        session = self.Session()
+
+        summary = (
+            session.query(
+                self.CompetitionCategory.name,
+                self.Group.name,
+                self.Score.criteria_1_score,
+                self.Score.criteria_2_score,
+                self.Score.criteria_3_score,
+                self.Score.criteria_4_score,
+                self.Score.notes_filepath,
+                self.Score.remarks_text,
+            )
+            .join(self.Group, self.Group.group_id == self.Score.group_id)
+            .join(
+                self.CompetitionCategory,
+                self.CompetitionCategory.category_id == self.Score.category_id,
+            )
+            .filter(self.Score.judge_id == judge_id)
+            .order_by(self.CompetitionCategory.name, self.Group.name)
+            .all()
+        )
+
+        self.Session.remove()
+
+        return summary
+
     # Check for existence of submitted scores in Score table
     def check_score_existence(self, judge_id):
         session = self.Session()
@@ -960,6 +1438,21 @@ class DBHelper:
 
         return bool(scores)
 
+    # Return whether each judge has submitted any scores, for all judges at once
+    def get_score_existence_by_judge(self):
+        session = self.Session()
+
+        judges = (
+            session.query(self.Judge.judge_id, func.count(self.Score.score_id))
+            .outerjoin(self.Score, self.Score.judge_id == self.Judge.judge_id)
+            .group_by(self.Judge.judge_id)
+            .all()
+        )
+
+        self.Session.remove()
+
+        return {judge_id: bool(scores) for judge_id, scores in judges}
+
     # Return a list of the teams that have been judged by a specific judge
     def get_judged_teams(self, judge_id):
         session = self.Session()
@@ -967,17 +1460,13 @@ class DBHelper:
         judged_groups = (
             session.query(self.Score.group_id)
             .filter(self.Score.judge_id == judge_id)
+            .distinct()
             .all()
         )
 
-        name_list = []
-        for group in judged_groups:
-            name = self.get_group_name(group[0])
-            name_list.append(name)
-
         self.Session.remove()
 
-        return sorted(list(set(name_list)))
+        return sorted([self.get_group_name(group[0]) for group in judged_groups])
 
     # Return a list of the categories that have been judged by a specific judge
     def get_judged_categories(self, judge_id):
@@ -1045,3 +1534,33 @@ class DBHelper:
         self.Session.remove()
 
         return category_score[0]
+
+
+# Awaitable variant of DBHelper with the same method surface, to be used by async handlers
+# Each call is offloaded to a bounded thread pool so that MySQL round trips do not block the event loop
+# This is safe since the scoped sessions of DBHelper are thread-local
+# Keep max_workers within the connection pool size so that the threads do not queue for connections
+class AsyncDBHelper:
+    def __init__(self, db, max_workers=settings.DB_EXECUTOR_WORKERS):
+        self.db = db
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="dbhelper"
+        )
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+
+        if not callable(method):
+            return method
+
+        @functools.wraps(method)
+        async def offloaded_method(*args, **kwargs):
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(
+                self.executor, functools.partial(method, *args, **kwargs)
+            )
+
+        # Cache the wrapper so that __getattr__ is only called once per method
+        setattr(self, name, offloaded_method)
+
+        return offloaded_method
@@ -4,68 +4,410 @@
 
 
 # Import libraries
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
 from google.cloud import firestore
 import os
+import time
 import settings
-import config
 
+from databases.conversations import ConversationBackend, AsyncConversationBackend
+from typing import NamedTuple
 
-class FireConn:
+
+# Maximum number of writes allowed in a single Firestore batch
+MAX_BATCH_WRITES = 500
+
+# Maximum number of conditional writes attempted by a state transition before giving up on a heavily contended conversation
+MAX_TRANSITION_ATTEMPTS = 5
+
+# Name of the subcollection that holds the per-user conversation documents of a channel
+# Collection group queries match every subcollection with this name across the project, so it must not be a generic one such as "users"
+USERS_COLLECTION = "conversation_users"
+
+
+# Errors of a conditional write whose precondition did not hold (the document was created, changed or deleted in the meantime)
+WRITE_CONFLICTS = (AlreadyExists, FailedPrecondition, NotFound)
+
+# Steps of a state transition
+TRANSITION_WRITE, TRANSITION_FETCH, TRANSITION_REJECT = range(3)
+
+
+# Each user's conversation is stored in its own document at conversations/{channel_id}/conversation_users/{user_id}
+# This way, reads only fetch the caller's record and judges in the same channel never write to the same document
+# This works with both the sync and the async client
+def user_document(db, channel_id, user_id):
+    return (
+        db.collection("conversations")
+        .document(f"{str(channel_id)}")
+        .collection(USERS_COLLECTION)
+        .document(f"{str(user_id)}")
+    )
+
+
+# Local copy of a user's conversation document
+# The version is the document's update time (None if it did not exist), which is used as a precondition when writing
+class CachedConversation(NamedTuple):
+    record: dict
+    version: object
+    fetched_at: float
+
+
+class FireConn(ConversationBackend):
     # Establish Firestore Client connection
-    def __init__(self):
+    def __init__(self, initial_state, ttl=settings.CONVERSATION_CACHE_TTL):
+        super().__init__(initial_state)
         self.db = firestore.Client()
 
-    # Define atomic functions
-    # Note that Firestore does not have any default rate-limiting by design (limiting billing is not an option)
+        # Write-through cache of the conversation documents of this worker, keyed by (channel_id, user_id)
+        self.ttl = ttl
+        self.cache = {}
+
+    def user_document(self, channel_id, user_id):
+        return user_document(self.db, channel_id, user_id)
+
+    # Cache handling shared with AsyncFireConn, which only differs in how it calls Firestore
+
+    # Cache the user's conversation document as it was just read from Firestore
+    def cache_snapshot(self, channel_id, user_id, snapshot):
+        entry = CachedConversation(
+            snapshot.to_dict() or {},
+            snapshot.update_time if snapshot.exists else None,
+            time.monotonic(),
+        )
+        self.cache[(str(channel_id), str(user_id))] = entry
+
+        return entry
+
+    # Return the user's cached conversation entry, or None if it has to be read from Firestore because the cached copy is missing or too old
+    def cached(self, channel_id, user_id):
+        entry = self.cache.get((str(channel_id), str(user_id)))
+
+        if entry is None or time.monotonic() - entry.fetched_at >= self.ttl:
+            return None
+
+        return entry
+
+    def forget(self, channel_id, user_id):
+        self.cache.pop((str(channel_id), str(user_id)), None)
+
+    # Precondition of a conditional write of the entry: None if the document did not exist (so it has to be created), otherwise its version
+    def write_option(self, entry):
+        if entry.version is None:
+            return None
+
+        return self.db.write_option(last_update_time=entry.version)
+
+    # Keep the cache in sync with the result of a conditional write (None if its precondition failed) and return whether it was written
+    def record_write(self, channel_id, user_id, entry, fields, result):
+        if result is None:
+            self.forget(channel_id, user_id)
+            return False
+
+        self.cache[(str(channel_id), str(user_id))] = CachedConversation(
+            {**entry.record, **fields}, result.update_time, time.monotonic()
+        )
+
+        return True
+
+    # Decide the next step of a transition from the current state of the entry
+    # The cached copy might be stale, so it is only rejected once a fresh copy from Firestore confirms it
+    @staticmethod
+    def transition_step(state, expected_states, verified):
+        if state in expected_states:
+            return TRANSITION_WRITE
+
+        return TRANSITION_REJECT if verified else TRANSITION_FETCH
+
+    # Read the user's conversation document from Firestore and cache it
+    def fetch(self, channel_id, user_id):
+        return self.cache_snapshot(
+            channel_id, user_id, self.user_document(channel_id, user_id).get()
+        )
+
+    # Return the user's cached conversation entry, only reading from Firestore if the cached copy is too old
+    def lookup(self, channel_id, user_id):
+        return self.cached(channel_id, user_id) or self.fetch(channel_id, user_id)
+
+    def read(self, channel_id, user_id):
+        return self.lookup(channel_id, user_id).record
+
+    # Write the given fields only if the document has not changed since the entry was read, and return whether it was written
+    def conditional_write(self, channel_id, user_id, entry, fields):
+        reference = self.user_document(channel_id, user_id)
+        option = self.write_option(entry)
 
-    def get_state(self, channel_id, user_id):
         try:
-            state = (
-                self.db.collection("conversations")
-                .document(f"{str(channel_id)}")
-                .get()
-                .to_dict()[f"{str(user_id)}"]["state"]
+            if option is None:
+                result = reference.create(fields)
+            else:
+                result = reference.update(fields, option=option)
+
+        except WRITE_CONFLICTS:
+            result = None
+
+        return self.record_write(channel_id, user_id, entry, fields, result)
+
+    # Write the given fields and keep the cached copy in sync
+    # If the document has changed since it was cached (such as when another worker handled the user's last request), the cached copy is stale, so it is dropped after writing
+    def write(self, channel_id, user_id, fields):
+        fields = self.stamped(fields)
+        entry = self.cache.get((str(channel_id), str(user_id)))
+
+        if entry is not None and self.conditional_write(
+            channel_id, user_id, entry, fields
+        ):
+            return
+
+        self.forget(channel_id, user_id)
+        self.user_document(channel_id, user_id).set(fields, merge=True)
+
+    # Double-clicks and retried Slack requests racing through the same step will only have one winner
+    # With a fresh cached copy, this costs a single conditional write
+    def transition(
+        self, channel_id, user_id, expected_states, new_state, ts=None, clear_remark=False
+    ):
+        fields = self.transition_fields(new_state, ts, clear_remark)
+
+        entry = self.lookup(channel_id, user_id)
+        verified = False
+
+        for _ in range(MAX_TRANSITION_ATTEMPTS):
+            step = self.transition_step(
+                self.current_state(entry.record, user_id), expected_states, verified
             )
-            return state
 
-        except (TypeError, KeyError) as e:
-            status = config.db.check_score_existence(user_id)
-            if status:
-                self.db.collection("conversations").document(f"{str(channel_id)}").set(
-                    {f"{str(user_id)}": {"state": config.CONVERSATION_END}}, merge=True
-                )
-                return config.CONVERSATION_END
+            if step == TRANSITION_REJECT:
+                return False
 
-            else:
-                self.db.collection("conversations").document(f"{str(channel_id)}").set(
-                    {f"{str(user_id)}": {"state": config.INITIAL_STATE}}, merge=True
+            if step == TRANSITION_WRITE and self.conditional_write(
+                channel_id, user_id, entry, fields
+            ):
+                return True
+
+            entry = self.fetch(channel_id, user_id)
+            verified = True
+
+        return False
+
+    # Forget the cached copies of a channel (or of all channels)
+    def invalidate(self, channel_id=None):
+        if channel_id is None:
+            self.cache.clear()
+        else:
+            for key in [key for key in self.cache if key[0] == str(channel_id)]:
+                del self.cache[key]
+
+    # The existing documents are looked up with a single batched read and the missing ones are created with batched writes
+    # Return the number of documents that were created
+    def seed(self, channel_ids, states):
+        references = {
+            reference.path: reference
+            for reference in (
+                self.user_document(channel_id, user_id)
+                for channel_id in channel_ids
+                for user_id in states
+            )
+        }
+        missing = [
+            snapshot.reference.path
+            for snapshot in self.db.get_all(list(references.values()))
+            if not snapshot.exists
+        ]
+
+        # Documents are only created, never overwritten, since a conversation may have started since they were looked up
+        created = 0
+        for start in range(0, len(missing), MAX_BATCH_WRITES):
+            chunk = [
+                references[path] for path in missing[start : start + MAX_BATCH_WRITES]
+            ]
+
+            batch = self.db.batch()
+            for reference in chunk:
+                batch.create(reference, self.stamped({"state": states[reference.id]}))
+
+            try:
+                batch.commit()
+                created += len(chunk)
+
+            # A batch is applied all at once, so create its documents one by one and skip the ones that exist by now
+            except AlreadyExists:
+                for reference in chunk:
+                    try:
+                        reference.create(
+                            self.stamped({"state": states[reference.id]})
+                        )
+                        created += 1
+                    except AlreadyExists:
+                        pass
+
+        return created
+
+    # Both queries run over the conversation users collection group, so they need single-field indexes on "updated_at" and "state" with collection group scope
+    def sweep(self, expire_before, abandoned_before, abandoned_states):
+        users = self.db.collection_group(USERS_COLLECTION)
+
+        expired = 0
+        batch = self.db.batch()
+        writes = 0
+
+        for snapshot in users.where("updated_at", "<", expire_before).stream():
+            batch.delete(snapshot.reference)
+            self.cache.pop((snapshot.reference.parent.parent.id, snapshot.id), None)
+            expired += 1
+            writes += 1
+
+            if writes == MAX_BATCH_WRITES:
+                batch.commit()
+                batch = self.db.batch()
+                writes = 0
+
+        if writes:
+            batch.commit()
+
+        # Only reset the conversations that have not moved on in the meantime
+        reset = 0
+        for snapshot in users.where("state", "in", list(abandoned_states)).stream():
+            if (snapshot.to_dict() or {}).get("updated_at", 0) >= abandoned_before:
+                continue
+
+            try:
+                snapshot.reference.update(
+                    self.stamped({"state": self.initial_state(snapshot.id)}),
+                    option=self.db.write_option(last_update_time=snapshot.update_time),
                 )
-                return config.INITIAL_STATE
+                reset += 1
+
+            except (FailedPrecondition, NotFound):
+                pass
+
+            self.cache.pop((snapshot.reference.parent.parent.id, snapshot.id), None)
+
+        return expired, reset
+
+    # Move the conversations stored in the old layout (all users of a channel as fields of conversations/{channel_id}) to per-user documents
+    # Records that already exist in the new layout are newer and are kept as they are
+    # This is idempotent and returns the number of migrated records
+    def migrate_legacy_layout(self):
+        migrated = 0
+        batch = self.db.batch()
+        writes = 0
+
+        for channel in self.db.collection("conversations").stream():
+            legacy = {
+                user_id: record
+                for user_id, record in (channel.to_dict() or {}).items()
+                if isinstance(record, dict)
+            }
+            if not legacy:
+                continue
+
+            references = [
+                self.user_document(channel.id, user_id) for user_id in legacy
+            ]
+            existing = {
+                snapshot.id
+                for snapshot in self.db.get_all(references)
+                if snapshot.exists
+            }
+
+            for reference in references:
+                if reference.id not in existing:
+                    batch.set(reference, self.stamped(legacy[reference.id]))
+                    migrated += 1
+                    writes += 1
+
+                if writes >= MAX_BATCH_WRITES - 1:
+                    batch.commit()
+                    batch = self.db.batch()
+                    writes = 0
 
-    def change_state(self, channel_id, user_id, state):
-        self.db.collection("conversations").document(f"{str(channel_id)}").set(
-            {f"{str(user_id)}": {"state": state}}, merge=True
+            # Deleting the channel document does not delete its conversation users subcollection
+            batch.delete(channel.reference)
+            writes += 1
+
+        if writes:
+            batch.commit()
+
+        self.invalidate()
+
+        return migrated
+
+
+# Awaitable FireConn built on Firestore's AsyncClient, so that the Firestore calls of concurrent async handlers overlap
+# It shares the write-through cache of the given FireConn, so that both see each other's writes
+# Only the Firestore calls are made here, everything else is left to the given FireConn
+class AsyncFireConn(AsyncConversationBackend):
+    def __init__(self, backend):
+        super().__init__(backend)
+        self.db = firestore.AsyncClient()
+
+    def user_document(self, channel_id, user_id):
+        return user_document(self.db, channel_id, user_id)
+
+    async def fetch(self, channel_id, user_id):
+        return self.backend.cache_snapshot(
+            channel_id, user_id, await self.user_document(channel_id, user_id).get()
+        )
+
+    async def lookup(self, channel_id, user_id):
+        return self.backend.cached(channel_id, user_id) or await self.fetch(
+            channel_id, user_id
         )
 
-    def get_ts(self, channel_id, user_id):
+    async def read(self, channel_id, user_id):
+        return (await self.lookup(channel_id, user_id)).record
+
+    async def conditional_write(self, channel_id, user_id, entry, fields):
+        reference = self.user_document(channel_id, user_id)
+        option = self.backend.write_option(entry)
+
         try:
-            ts = (
-                self.db.collection("conversations")
-                .document(f"{str(channel_id)}")
-                .get()
-                .to_dict()[f"{str(user_id)}"]["timestamp"]
+            if option is None:
+                result = await reference.create(fields)
+            else:
+                result = await reference.update(fields, option=option)
+
+        except WRITE_CONFLICTS:
+            result = None
+
+        return self.backend.record_write(channel_id, user_id, entry, fields, result)
+
+    async def write(self, channel_id, user_id, fields):
+        fields = self.backend.stamped(fields)
+        entry = self.backend.cache.get((str(channel_id), str(user_id)))
+
+        if entry is not None and await self.conditional_write(
+            channel_id, user_id, entry, fields
+        ):
+            return
+
+        self.backend.forget(channel_id, user_id)
+        await self.user_document(channel_id, user_id).set(fields, merge=True)
+
+    async def transition(
+        self, channel_id, user_id, expected_states, new_state, ts=None, clear_remark=False
+    ):
+        fields = self.backend.transition_fields(new_state, ts, clear_remark)
+
+        entry = await self.lookup(channel_id, user_id)
+        verified = False
+
+        for _ in range(MAX_TRANSITION_ATTEMPTS):
+            step = self.backend.transition_step(
+                await self.current_state(entry.record, user_id),
+                expected_states,
+                verified,
             )
-            return ts
 
-        except (TypeError, KeyError) as e:
-            return None
+            if step == TRANSITION_REJECT:
+                return False
 
-    def change_ts(self, channel_id, user_id, ts):
-        self.db.collection("conversations").document(f"{str(channel_id)}").set(
-            {f"{str(user_id)}": {"timestamp": ts}}, merge=True
-        )
+            if step == TRANSITION_WRITE and await self.conditional_write(
+                channel_id, user_id, entry, fields
+            ):
+                return True
 
-    def change_state_ts(self, channel_id, user_id, state, ts):
-        self.db.collection("conversations").document(f"{str(channel_id)}").set(
-            {f"{str(user_id)}": {"state": state, "timestamp": ts}}, merge=True
-        )
+            entry = await self.fetch(channel_id, user_id)
+            verified = True
+
+        return False
@@ -0,0 +1,223 @@
+# coding: utf-8
+# Versioned and idempotent schema migrations for the SQL database
+# These are run explicitly with migrate.py (before the bot is started) instead of on every import of dbhelper.py,
+# so that starting a worker does not issue any DDL statements
+
+# Import libraries
+import datetime
+import logging
+
+from sqlalchemy import Column, DateTime, MetaData, Table, Text, UniqueConstraint
+from sqlalchemy import and_, func, inspect, select, text
+from sqlalchemy.dialects.mysql import INTEGER, VARCHAR
+from sqlalchemy.schema import AddConstraint, CreateIndex
+
+from databases.dbhelper import DBHelper
+
+logger = logging.getLogger(__name__)
+
+# Bookkeeping table of the applied migration versions
+schema_migration = Table(
+    "schema_migration",
+    MetaData(),
+    Column("version", INTEGER(11), primary_key=True, autoincrement=False),
+    Column("name", VARCHAR(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Tables whose UUID primary keys are generated by a BEFORE INSERT trigger, along with the primary key column
+UUID_TRIGGER_TABLES = (
+    ("category_group", "category_group_id"),
+    ("category_judge", "category_judge_id"),
+    ("category_participant", "category_participant_id"),
+    ("competition_category", "category_id"),
+    ("consumable", "consumable_id"),
+    ("consumable_group", "consumable_group_id"),
+    ("loan", "loan_id"),
+    ("score", "score_id"),
+    ("tool", "tool_id"),
+    ("participant", "participant_id"),
+    ("participant_organisation", "organisation_id"),
+    ("participant_next_of_kin", "NoK_id"),
+    ("_participant_preference_toi", "technology_of_interest_id"),
+    (
+        "_participant_preference_toi_participant",
+        "technology_of_interest_participant_id",
+    ),
+    ("_participant_preference_skills", "skills_id"),
+    ("_participant_preference_skills_participant", "skills_participant_id"),
+    ("_participant_preference_utensil_name", "utensil_name_id"),
+    (
+        "_participant_preference_utensil_name_participant",
+        "utensil_name_participant_id",
+    ),
+    ("_participant_preference_workshops", "workshops_id"),
+    ("_participant_preference_workshops_participant", "workshops_participant_id"),
+)
+
+# Rows that violate the unique keys of the association tables
+# These rows only consist of their keys, so nothing is lost by keeping only one row per key
+# Duplicated scores are not cleaned up, see find_duplicate_scores()
+DUPLICATE_ROW_CLEANUPS = (
+    "DELETE c1 FROM category_judge c1 JOIN category_judge c2 ON c1.judge_id = c2.judge_id AND c1.category_id = c2.category_id AND c1.category_judge_id > c2.category_judge_id",
+    "DELETE c1 FROM category_group c1 JOIN category_group c2 ON c1.group_id = c2.group_id AND c1.category_id = c2.category_id AND c1.category_group_id > c2.category_group_id",
+    "DELETE c1 FROM category_participant c1 JOIN category_participant c2 ON c1.participant_id = c2.participant_id AND c1.category_id = c2.category_id AND c1.category_participant_id > c2.category_participant_id",
+)
+
+
+# Return the scores that violate the unique key of the score table (such as double submissions), ordered by their key
+# These cannot be told apart by age and might hold different criteria scores or remarks, so a judge or admin has to decide which one to keep
+def find_duplicate_scores(db, connection):
+    score = db.Score.__table__
+    keys = (score.c.judge_id, score.c.group_id, score.c.category_id)
+    duplicated = select(*keys).group_by(*keys).having(func.count() > 1).subquery()
+
+    return connection.execute(
+        select(score)
+        .join(
+            duplicated,
+            and_(*(column == duplicated.c[column.name] for column in keys)),
+        )
+        .order_by(*keys, score.c.score_id)
+    ).fetchall()
+
+
+# Define migrations
+# Each migration has to be idempotent, since databases created by older versions of the bot might already be partially migrated
+
+
+def create_tables(db, connection):
+    # Create the model in the SQL database if the tables do not exist yet (conditional by default)
+    db.metadata.create_all(connection)
+
+    if connection.dialect.name != "mysql":
+        return
+
+    # Generate UUIDs for the primary keys on the database side
+    for table, column in UUID_TRIGGER_TABLES:
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {table}_trigger"))
+        connection.execute(
+            text(
+                f"CREATE TRIGGER {table}_trigger BEFORE INSERT ON {table} FOR EACH ROW SET NEW.{column} = UUID()"
+            )
+        )
+
+    # This is a special hacky workaround since "group" is a reserved keyword in PyMySQL
+    connection.execute(text("DROP TRIGGER IF EXISTS group_trigger"))
+    connection.execute(
+        text(
+            "CREATE TRIGGER group_trigger BEFORE INSERT ON `group` FOR EACH ROW SET NEW.group_id = UUID(), NEW.hack_submitted = 0, NEW.utensils_returned = 0"
+        )
+    )
+
+
+def add_indexes(db, connection):
+    inspector = inspect(connection)
+
+    # Stop before changing anything, so that the migration can be run again once the duplicated scores have been resolved
+    duplicate_scores = find_duplicate_scores(db, connection)
+    if duplicate_scores:
+        for row in duplicate_scores:
+            logger.error(f"Duplicated score: {dict(row._mapping)}")
+
+        raise RuntimeError(
+            f"Found {len(duplicate_scores)} score(s) sharing a judge, group and category. "
+            "Delete all but one score of each of them before migrating again."
+        )
+
+    # Names are looked up by equality, so they need to be indexable VARCHARs instead of TEXT columns
+    # Duplicated group or category names have to be resolved by hand before this step
+    for table in ("group", "competition_category"):
+        name_column = next(
+            column
+            for column in inspector.get_columns(table)
+            if column["name"] == "name"
+        )
+        if isinstance(name_column["type"], Text):
+            connection.execute(
+                text(f"ALTER TABLE `{table}` MODIFY name VARCHAR(255) NOT NULL")
+            )
+
+    if connection.dialect.name == "mysql":
+        for statement in DUPLICATE_ROW_CLEANUPS:
+            deleted = connection.execute(text(statement)).rowcount
+            if deleted:
+                logger.warning(f"Deleted {deleted} duplicated row(s): {statement}")
+
+    # Add the indexes and unique keys declared in the models that are still missing
+    for table in db.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)} | {
+            constraint["name"]
+            for constraint in inspector.get_unique_constraints(table.name)
+        }
+
+        for index in table.indexes:
+            if index.name not in existing:
+                connection.execute(CreateIndex(index))
+
+        for constraint in table.constraints:
+            if isinstance(constraint, UniqueConstraint) and (
+                constraint.name not in existing
+            ):
+                connection.execute(AddConstraint(constraint))
+
+
+def backfill_score_aggregates(db, connection):
+    drift = db.rebuild_score_aggregates()
+    logger.info(f"Backfilled {len(drift)} leaderboard aggregate(s).")
+
+
+def seed_categories(db, connection):
+    # Add category list to database
+    if not db.get_all_categories():
+        db.add_all_categories()
+
+
+# Append new migrations to the end of this list (never reorder or remove any applied ones)
+MIGRATIONS = (
+    (1, "create_tables", create_tables),
+    (2, "add_indexes", add_indexes),
+    (3, "backfill_score_aggregates", backfill_score_aggregates),
+    (4, "seed_categories", seed_categories),
+)
+
+
+# Apply all pending migrations in order and return the versions that were applied
+def migrate(db=None):
+    db = db or DBHelper()
+    engine = db.get_engine()
+    applied_now = []
+
+    with engine.connect() as connection:
+        # Prevent concurrent deployments from migrating at the same time
+        if connection.dialect.name == "mysql":
+            connection.execute(text("SELECT GET_LOCK('sutdwth_migrations', 60)"))
+
+        try:
+            schema_migration.create(connection, checkfirst=True)
+            applied = {
+                row[0]
+                for row in connection.execute(schema_migration.select()).fetchall()
+            }
+
+            for version, name, migration in MIGRATIONS:
+                if version in applied:
+                    continue
+
+                logger.info(f"Applying migration {version} ({name})...")
+                with connection.begin():
+                    migration(db, connection)
+                    connection.execute(
+                        schema_migration.insert().values(
+                            version=version,
+                            name=name,
+                            applied_at=datetime.datetime.utcnow(),
+                        )
+                    )
+                applied_now.append(version)
+
+        finally:
+            if connection.dialect.name == "mysql":
+                connection.execute(text("SELECT RELEASE_LOCK('sutdwth_migrations')"))
+
+    return applied_now
@@ -0,0 +1,27 @@
+# coding: utf-8
+# Connections to the local SQLite databases that the workers on the same machine share (such as for conversations and deliveries)
+
+# Import libraries
+import os
+import sqlite3
+import threading
+
+
+class LocalSQLite:
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    # SQLite connections cannot be shared across threads or forked processes, so each thread of each process opens its own
+    def connection(self):
+        if getattr(self.local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            # Readers do not block the writer (and vice versa) in WAL mode
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+
+        return self.local.connection
@@ -0,0 +1,284 @@
+# coding: utf-8
+# Ack-first dispatching of Slack requests to the handlers registered with the slackers hooks
+# Slack expects every request to be acknowledged within 3 seconds, so the handlers are only run once the response has been sent
+# This replaces the routes of slackers.server (with the same paths and request verification)
+
+# Import libraries
+import asyncio
+import functools
+import json
+import logging
+import threading
+import time
+import typing
+
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+import settings
+
+from idempotency import DELIVERY_BACKENDS, Deliveries, delivery_key
+
+from fastapi import APIRouter, Depends
+from fastapi.encoders import jsonable_encoder
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import Response
+
+from slackers.hooks import actions, commands, events
+from slackers.models import SlackAction, SlackChallenge, SlackCommand, SlackEnvelope
+from slackers.registry import R
+from slackers.server import _add_action_triggers
+from slackers.verification import check_timeout, verify_signature
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Handlers that are still running in the background (references are kept so that they are not garbage-collected)
+background_tasks: typing.Set[asyncio.Future] = set()
+
+# Sync handlers make blocking database and Firestore calls, so they are run in these threads instead of on the event loop
+handler_executor = ThreadPoolExecutor(
+    max_workers=settings.HANDLER_EXECUTOR_WORKERS, thread_name_prefix="handler"
+)
+
+
+# Time-to-ack of each kind of request handled by this worker
+class AckMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = {}
+
+    def record(self, label, elapsed):
+        with self.lock:
+            count, total, slowest, slow = self.requests.get(label, (0, 0.0, 0.0, 0))
+            self.requests[label] = (
+                count + 1,
+                total + elapsed,
+                max(slowest, elapsed),
+                slow + (elapsed > settings.ACK_SLOW_THRESHOLD),
+            )
+
+        if elapsed > settings.ACK_SLOW_THRESHOLD:
+            logger.warning(f"Took {elapsed:.3f}s to acknowledge {label}.")
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                label: {
+                    "count": count,
+                    "average": total / count,
+                    "max": slowest,
+                    "slow": slow,
+                }
+                for label, (count, total, slowest, slow) in sorted(
+                    self.requests.items()
+                )
+            }
+
+
+ack_metrics = AckMetrics()
+
+# Deliveries that have been handled recently
+deliveries: Deliveries = DELIVERY_BACKENDS[settings.DELIVERY_BACKEND]()
+
+
+# ASGI middleware that measures the time between receiving a Slack request and starting to send its response
+class AckTimer:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                # The routes below label the request with its command or action
+                label = scope.get("state", {}).get("ack_label")
+                if label:
+                    ack_metrics.record(label, time.perf_counter() - start)
+
+            await send(message)
+
+        await self.app(scope, receive, timed_send)
+
+
+# Tell the user that their request could not be completed, since the original request has long been acknowledged
+async def report_failure(payload):
+    response_url = payload.get("response_url")
+    if not response_url:
+        return
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            await session.post(
+                response_url,
+                json={
+                    "response_type": "ephemeral",
+                    "text": "Apologies! Something went wrong while handling your request. Please try again.",
+                },
+            )
+
+    except aiohttp.ClientError as e:
+        logger.error(f"Failed to report a failed request: {e}")
+
+
+# Cheap checks that a handler declares on the payload with @when, so that it is not run at all for payloads that it would ignore
+# They only look at the payload itself, so they never do any I/O
+def when(*predicates):
+    def decorator(handler):
+        handler.predicates = getattr(handler, "predicates", ()) + predicates
+        return handler
+
+    return decorator
+
+
+def accepts(handler, payload):
+    return all(predicate(payload) for predicate in getattr(handler, "predicates", ()))
+
+
+# Predicates on the event of an Events API payload
+
+
+def is_thread_reply(payload):
+    event = payload["event"]
+    return "thread_ts" in event and event["thread_ts"] != event.get("ts")
+
+
+def replies_to(user_id):
+    return lambda payload: payload["event"].get("parent_user_id") == user_id
+
+
+# None stands for plain messages, which do not have a subtype
+def has_subtype(*subtypes):
+    return lambda payload: payload["event"].get("subtype") in subtypes
+
+
+# An empty allow-list allows every channel
+def in_channels(channel_ids):
+    channel_ids = frozenset(channel_ids)
+    return lambda payload: not channel_ids or payload["event"].get("channel") in channel_ids
+
+
+async def run_handler(emitter, event, handler, payload):
+    try:
+        if asyncio.iscoroutinefunction(handler):
+            await handler(payload)
+        else:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(
+                handler_executor, functools.partial(handler, payload)
+            )
+
+    except Exception as e:
+        logger.exception(f"Handler for '{emitter.name}:{event}' failed: {e}")
+        await report_failure(payload)
+
+
+# Run every handler of the event that accepts the payload as a tracked background task
+async def dispatch(emitter, event, payload):
+    payload = jsonable_encoder(payload)
+
+    for handler in emitter.listeners(event):
+        if not accepts(handler, payload):
+            continue
+
+        task = asyncio.ensure_future(run_handler(emitter, event, handler, payload))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+
+# Acknowledge the request right away and dispatch the events after the response has been sent
+def acknowledge(request, label, emitter, emitted_events, payload, response=None):
+    request.state.ack_label = label
+
+    async def dispatch_all():
+        for event in emitted_events:
+            await dispatch(emitter, event, payload)
+
+    response = response or Response()
+    response.background = BackgroundTask(dispatch_all)
+
+    return response
+
+
+@router.post(
+    "/events",
+    dependencies=[Depends(verify_signature), Depends(check_timeout)],
+)
+async def post_events(
+    request: Request, message: typing.Union[SlackEnvelope, SlackChallenge]
+):
+    if isinstance(message, SlackChallenge):
+        return message.challenge
+
+    event = message.event["type"]
+
+    # Retries of an event that has already been handled are acknowledged without handling them again
+    if not deliveries.claim(delivery_key("event", message)):
+        retry = request.headers.get("X-Slack-Retry-Num")
+        logger.info(f"Ignored duplicate event {message.event_id} (retry {retry}).")
+        return acknowledge(request, f"duplicate event {event}", events, [], message)
+
+    return acknowledge(request, f"event {event}", events, [event], message)
+
+
+@router.post(
+    "/actions",
+    dependencies=[Depends(verify_signature), Depends(check_timeout)],
+)
+async def post_actions(request: Request):
+    form = await request.form()
+    action = SlackAction(**json.loads(form["payload"]))
+
+    key = delivery_key("action", action)
+    if key is not None and not deliveries.claim(key):
+        logger.info(f"Ignored duplicate {action.type} ({key}).")
+        return acknowledge(request, f"duplicate {action.type}", actions, [], action)
+
+    emitted_events = [action.type]
+    if action.actions:
+        emitted_events.extend(_add_action_triggers(action))
+    if action.callback_id:
+        emitted_events.append(f"{action.type}:{action.callback_id}")
+    if action.view and action.view.get("callback_id"):
+        emitted_events.append(f"{action.type}:{action.view['callback_id']}")
+
+    # Responders (such as input validation) answer within the response itself, so they cannot be deferred
+    responders = set(R.callbacks.keys()).intersection(emitted_events)
+    if len(responders) > 1:
+        raise ValueError("Multiple response handlers found.")
+
+    response = R.handle(responders.pop(), action.dict()) if responders else None
+
+    # Label the request with the first event after its type (such as its action ID or callback ID)
+    return acknowledge(
+        request,
+        emitted_events[min(1, len(emitted_events) - 1)],
+        actions,
+        emitted_events,
+        action,
+        response,
+    )
+
+
+@router.post(
+    "/commands",
+    dependencies=[Depends(verify_signature), Depends(check_timeout)],
+)
+async def post_commands(request: Request):
+    form = await request.form()
+    command = SlackCommand(**form)
+
+    return acknowledge(
+        request, command.command, commands, [command.command.lstrip("/")], command
+    )
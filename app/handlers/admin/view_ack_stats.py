@@ -0,0 +1,42 @@
+# coding: utf-8
+# View how quickly the worker that handles this command acknowledges Slack requests
+
+import os
+import settings
+import config
+import dispatch
+
+from slackers.hooks import commands
+
+
+@commands.on("ackstats")
+def ackstats(payload):
+    channel = payload["channel_id"]
+    user_id = payload["user_id"]
+
+    if user_id == settings.MASTER_ID:
+        stats = dispatch.ack_metrics.snapshot()
+
+        lines = [
+            f"• `{label}`: {entry['count']} request(s), average {entry['average'] * 1000:.1f}ms, maximum {entry['max'] * 1000:.1f}ms (slower than {settings.ACK_SLOW_THRESHOLD}s: {entry['slow']})"
+            for label, entry in stats.items()
+        ]
+
+        # Each gunicorn worker keeps its own statistics, so repeat this command to sample the other workers
+        config.web_client.chat_postMessage(
+            channel=channel,
+            text=(
+                f"Hello <@{user_id}>! Time to acknowledge Slack requests in worker {os.getpid()} "
+                f"({len(dispatch.background_tasks)} handler(s) still running):\r\n\r\n"
+                + ("\r\n".join(lines) or "No requests have been handled yet.")
+            ),
+        )
+
+    else:
+        config.logger.warning(f"Unauthorized access denied for user {user_id}.")
+        config.web_client.chat_postMessage(
+            channel=channel,
+            text=f"Hi <@{user_id}>! You do not seem to have enough privileges to execute that command. Apologies!\r\n",
+        )
+
+    return
@@ -0,0 +1,37 @@
+# coding: utf-8
+# View the database connection pool usage of the worker that handles this command
+
+import settings
+import config
+
+from slackers.hooks import commands
+
+
+@commands.on("poolstats")
+def poolstats(payload):
+    channel = payload["channel_id"]
+    user_id = payload["user_id"]
+
+    if user_id == settings.MASTER_ID:
+        stats = config.db.get_pool_stats()
+
+        # Each gunicorn worker has its own pool, so repeat this command to sample the other workers
+        config.web_client.chat_postMessage(
+            channel=channel,
+            text=(
+                f"Hello <@{user_id}>! Database connection pool of worker {stats['pid']}:\r\n\r\n"
+                f"• Pool size: {stats['pool_size']} (checked out: {stats['checked_out']}, overflow: {stats['overflow']})\r\n"
+                f"• Checkouts: {stats['checkouts']} (slower than {settings.DB_POOL_SLOW_CHECKOUT}s: {stats['slow_checkouts']})\r\n"
+                f"• Average wait: {stats['average_wait'] * 1000:.1f}ms\r\n"
+                f"• Maximum wait: {stats['max_wait'] * 1000:.1f}ms"
+            ),
+        )
+
+    else:
+        config.logger.warning(f"Unauthorized access denied for user {user_id}.")
+        config.web_client.chat_postMessage(
+            channel=channel,
+            text=f"Hi <@{user_id}>! You do not seem to have enough privileges to execute that command. Apologies!\r\n",
+        )
+
+    return
@@ -0,0 +1,30 @@
+# coding: utf-8
+# Initialize the conversations of all judges in the judging channels ahead of the judging rush
+
+import settings
+import config
+
+from slackers.hooks import commands
+
+
+@commands.on("warmup")
+def warm_up(payload):
+    channel = payload["channel_id"]
+    user_id = payload["user_id"]
+
+    if user_id == settings.MASTER_ID:
+        seeded = config.warm_up_conversations()
+
+        config.web_client.chat_postMessage(
+            channel=channel,
+            text=f"Hello <@{user_id}>! {seeded} new judge conversation(s) have been initialized in {len(settings.JUDGING_CHANNEL_IDS)} judging channel(s).",
+        )
+
+    else:
+        config.logger.warning(f"Unauthorized access denied for user {user_id}.")
+        config.web_client.chat_postMessage(
+            channel=channel,
+            text=f"Hi <@{user_id}>! You do not seem to have enough privileges to execute that command. Apologies!\r\n",
+        )
+
+    return
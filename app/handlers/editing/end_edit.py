@@ -20,9 +20,10 @@ conv_db = config.conv_handler
 def finalize_judging(payload):
     channel = payload["channel"]["id"]
     user_id = payload["user"]["id"]
-    state = conv_db.get_state(channel, user_id)
-
-    if state != config.EDIT_REMARKS:
+    # End the conversation right away so that only one of several clicks finalizes it
+    if not conv_db.transition(
+        channel, user_id, (config.EDIT_REMARKS,), config.CONVERSATION_END
+    ):
         config.web_client.chat_postMessage(
             channel=channel,
             text=f"You can only execute this command after submitting scores as a judge, <@{user_id}>!",
@@ -35,6 +36,4 @@ def finalize_judging(payload):
             channel=channel, text=message, ts=latest_message_ts, blocks=None
         )
 
-        conv_db.change_state(channel, user_id, config.CONVERSATION_END)
-
     return
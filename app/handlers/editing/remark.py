@@ -13,6 +13,7 @@ from slackers.hooks import actions, emit, responder
 from starlette.responses import Response, JSONResponse
 
 conv_db = config.conv_handler
+async_conv_db = config.async_conv_handler
 
 
 # Function recipe to loop through a list n items at a time
@@ -66,103 +67,125 @@ async def remark_team(payload):
     channel = payload["view"]["private_metadata"].split(", ")[0]
     group_name = payload["view"]["private_metadata"].split(", ", 1)[1]
 
-    if user_id in config.db.get_all_judges():
-        state = conv_db.get_state(channel, user_id)
-
-        # Validate state
-        if state == config.EDIT_SCORE:
-
-            for c1, c2, c3, c4 in grouper(
-                4, list(payload["view"]["state"]["values"].items())
-            ):
-                category_name = c1[0].split("_")[0]
-
-                criteria_1_score = int(list(c1[1].items())[0][1]["value"])
-                criteria_2_score = int(list(c2[1].items())[0][1]["value"])
-                criteria_3_score = int(list(c3[1].items())[0][1]["value"])
-                criteria_4_score = int(list(c4[1].items())[0][1]["value"])
-
-                config.db.edit_score(
-                    user_id,
-                    group_name,
-                    category_name,
-                    criteria_1_score,
-                    criteria_2_score,
-                    criteria_3_score,
-                    criteria_4_score,
-                )
-
-            remark = config.db.get_specific_remark(user_id, group_name)
-
-            edit_remark_message_block = [
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": f"Scores have been edited for team: *{group_name}*!\r\n\r\nIf you would like to edit the remarks for the team that you have judged, *reply* to this message with some textual remarks or/and *one* photo of your remarks as a *threaded reply*. Please note that other types of messages will be ignored.\r\n\r\nOtherwise, press the button to finalize your judging process.\r\n\r\n",
-                    },
-                    "accessory": {
-                        "type": "button",
+    if await config.async_db.is_judge(user_id):
+        # Validate state and claim the submission before storing the scores, so that a resubmitted form is only stored once
+        # The thread of the previous team is let go as well, so that late replies to it are not taken as remarks for this team
+        if await async_conv_db.transition(
+            channel,
+            user_id,
+            (config.EDIT_SCORE,),
+            config.EDIT_REMARKS,
+            clear_remark=True,
+        ):
+            try:
+                scores = {}
+                for c1, c2, c3, c4 in grouper(
+                    4, list(payload["view"]["state"]["values"].items())
+                ):
+                    category_name = c1[0].split("_")[0]
+
+                    scores[category_name] = (
+                        int(list(c1[1].items())[0][1]["value"]),
+                        int(list(c2[1].items())[0][1]["value"]),
+                        int(list(c3[1].items())[0][1]["value"]),
+                        int(list(c4[1].items())[0][1]["value"]),
+                    )
+
+                # Store the scores of all categories at once so that a judging form is never half-submitted
+                await config.async_db.edit_scores_bulk(user_id, group_name, scores)
+
+                remark = await config.async_db.get_specific_remark(user_id, group_name)
+
+                edit_remark_message_block = [
+                    {
+                        "type": "section",
                         "text": {
-                            "type": "plain_text",
-                            "text": "Finish editing",
-                            "emoji": True,
+                            "type": "mrkdwn",
+                            "text": f"Scores have been edited for team: *{group_name}*!\r\n\r\nIf you would like to edit the remarks for the team that you have judged, *reply* to this message with some textual remarks or/and *one* photo of your remarks as a *threaded reply*. Please note that other types of messages will be ignored.\r\n\r\nOtherwise, press the button to finalize your judging process.\r\n\r\n",
                         },
-                        "action_id": "editing_end",
-                        "style": "danger",
-                        "value": "confirm_end_editing",
-                        "confirm": {
-                            "title": {
-                                "type": "plain_text",
-                                "text": "Are you sure?",
-                            },
+                        "accessory": {
+                            "type": "button",
                             "text": {
-                                "type": "mrkdwn",
-                                "text": "If you change your mind, feel free to edit your remarks entry later.",
-                            },
-                            "confirm": {
                                 "type": "plain_text",
-                                "text": "Yes, just do it!",
+                                "text": "Finish editing",
+                                "emoji": True,
                             },
-                            "deny": {
-                                "type": "plain_text",
-                                "text": "Stop, I've changed my mind!",
+                            "action_id": "editing_end",
+                            "style": "danger",
+                            "value": "confirm_end_editing",
+                            "confirm": {
+                                "title": {
+                                    "type": "plain_text",
+                                    "text": "Are you sure?",
+                                },
+                                "text": {
+                                    "type": "mrkdwn",
+                                    "text": "If you change your mind, feel free to edit your remarks entry later.",
+                                },
+                                "confirm": {
+                                    "type": "plain_text",
+                                    "text": "Yes, just do it!",
+                                },
+                                "deny": {
+                                    "type": "plain_text",
+                                    "text": "Stop, I've changed my mind!",
+                                },
                             },
                         },
-                    },
-                }
-            ]
-
-            if remark[0] is not None:
-                edit_remark_message_block.append(
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": f"Your current remarks image for *{group_name}* is at: {remark[0]}",
-                        },
                     }
-                )
+                ]
 
-            if remark[1] is not None:
-                edit_remark_message_block.append(
+                if remark[0] is not None:
+                    edit_remark_message_block.append(
+                        {
+                            "type": "section",
+                            "text": {
+                                "type": "mrkdwn",
+                                "text": f"Your current remarks image for *{group_name}* is at: {remark[0]}",
+                            },
+                        }
+                    )
+
+                if remark[1] is not None:
+                    edit_remark_message_block.append(
+                        {
+                            "type": "section",
+                            "text": {
+                                "type": "mrkdwn",
+                                "text": f"Your current remarks text for *{group_name}* is: {remark[1]}",
+                            },
+                        }
+                    )
+
+                timestamp = (
+                    await config.web_client.chat_postMessage(
+                        channel=channel, blocks=edit_remark_message_block
+                    )
+                )["ts"]
+
+                # For message updating purposes, along with what the remarks replying to this message are about
+                await async_conv_db.change_ts_remark(
+                    channel,
+                    user_id,
+                    timestamp,
                     {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": f"Your current remarks text for *{group_name}* is: {remark[1]}",
-                        },
-                    }
+                        "group_id": await config.async_db.get_group_id(group_name),
+                        "group_name": group_name,
+                        "categories": list(scores),
+                    },
                 )
 
-            timestamp = (
-                await config.web_client.chat_postMessage(
-                    channel=channel, blocks=edit_remark_message_block
+            # Give the claim back if the scores could not be stored or the message could not be sent, so that the judge is not stuck waiting for remarks
+            # This handler is emitted by the score validation responder rather than dispatched, so the failure is reported to the judge here
+            except Exception:
+                await async_conv_db.transition(
+                    channel, user_id, (config.EDIT_REMARKS,), config.EDIT_SCORE
                 )
-            )["ts"]
-
-            # For message updating purposes; group together to prevent race condition
-            conv_db.change_state_ts(channel, user_id, config.EDIT_REMARKS, timestamp)
+                config.web_client.chat_postMessage(
+                    channel=channel,
+                    text=f"Hi <@{user_id}>! It seems that something went wrong while submitting your scores. Please cancel your current editing process with `/cancel` and retry. Apologies!",
+                )
+                raise
 
         else:
             config.fallback.view_fallback(payload)
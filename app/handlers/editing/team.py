@@ -9,17 +9,18 @@ import config
 from slackers.hooks import commands, actions
 
 conv_db = config.conv_handler
+async_conv_db = config.async_conv_handler
 
 
 # This serves as judging entry point
 @commands.on("edit")
-def choose_team(payload):
+async def choose_team(payload):
     channel = payload["channel_id"]
     user_id = payload["user_id"]
     trigger_id = payload["trigger_id"]
 
-    if user_id in config.db.get_all_judges():
-        state = conv_db.get_state(channel, user_id)
+    if await config.async_db.is_judge(user_id):
+        state = await async_conv_db.get_state(channel, user_id)
 
         if (state == config.TEAM_REMARKS) or (state == config.EDIT_REMARKS):
             config.web_client.chat_postMessage(
@@ -27,8 +28,14 @@ def choose_team(payload):
                 text=f"You can only end your judging process or reply with a photo of your remarks at this point, <@{user_id}>!",
             )
 
-        elif (state == config.INITIAL_STATE) or (state == config.CONVERSATION_END):
-            validated_teams = sorted(config.db.get_judged_teams(user_id))
+        # Claim the conversation before doing anything else so that double-clicks and retried requests only open one modal
+        elif await async_conv_db.transition(
+            channel,
+            user_id,
+            (config.INITIAL_STATE, config.CONVERSATION_END),
+            config.EDIT_TEAM,
+        ):
+            validated_teams = sorted(await config.async_db.get_judged_teams(user_id))
 
             if not validated_teams:
                 config.web_client.chat_postMessage(
@@ -36,6 +43,9 @@ def choose_team(payload):
                     text=f"Hi <@{user_id}>! It seems that either you are not qualified enough to judge any teams, no teams are allocated to you yet, or you have exhausted all possible teams to judge. Apologies!",
                 )
 
+                # Release the conversation that was claimed above
+                await async_conv_db.release(channel, user_id)
+
             else:
                 team_list = []
 
@@ -56,7 +66,7 @@ def choose_team(payload):
 
                 if len(team_list) <= settings.NUMBER_OF_GROUPS_LIMIT:
                     try:
-                        config.web_client.views_open(
+                        await config.web_client.views_open(
                             trigger_id=trigger_id,
                             view={
                                 "type": "modal",
@@ -101,9 +111,6 @@ def choose_team(payload):
                             },
                         )
 
-                        # Conduct the change of state after opening the modal view
-                        conv_db.change_state(channel, user_id, config.EDIT_TEAM)
-
                     # Catch expired trigger_id error
                     except slack.errors.SlackApiError as e:
                         config.web_client.chat_postMessage(
@@ -111,14 +118,7 @@ def choose_team(payload):
                             text=f"Hi <@{user_id}>! It seems that something went wrong. Feel free to retry the editing process. Apologies!",
                         )
 
-                        status = config.db.check_score_existence(user_id)
-
-                        if status:
-                            conv_db.change_state(
-                                channel, user_id, config.CONVERSATION_END
-                            )
-                        else:
-                            conv_db.change_state(channel, user_id, config.INITIAL_STATE)
+                        await async_conv_db.release(channel, user_id)
 
                 else:
                     config.web_client.chat_postMessage(
@@ -126,14 +126,7 @@ def choose_team(payload):
                             text=f"Hi <@{user_id}>! It seems that there are too many groups that you are assigned to. Unfortunately, this violates Slack's API limits. Please check with the organizing committee on this and retry the judging process again when everything is in order. Apologies!",
                         )
 
-                    status = config.db.check_score_existence(user_id)
-
-                    if status:
-                        conv_db.change_state(
-                            channel, user_id, config.CONVERSATION_END
-                        )
-                    else:
-                        conv_db.change_state(channel, user_id, config.INITIAL_STATE)
+                    await async_conv_db.release(channel, user_id)
 
         else:
             config.fallback.fallback(payload)
@@ -153,12 +146,8 @@ def choose_team(payload):
 def cancel_team_selection(payload):
     user_id = payload["user"]["id"]
     channel = payload["view"]["private_metadata"]
-    status = config.db.check_score_existence(user_id)
 
-    if status:
-        conv_db.change_state(channel, user_id, config.CONVERSATION_END)
-    else:
-        conv_db.change_state(channel, user_id, config.INITIAL_STATE)
+    conv_db.release(channel, user_id)
 
     config.web_client.chat_postMessage(
         channel=channel,
@@ -9,6 +9,7 @@ import settings
 import config
 import math
 import secrets
+import channels
 
 from slackers.hooks import commands
 from typing import Generator, Callable, List
@@ -21,29 +22,23 @@ async def randomizer(payload):
     channel = payload["channel_id"]
     user_id = payload["user_id"]
 
-    channel_name_checking_response = await config.web_client.conversations_info(
-        channel=channel, include_locale=True, include_num_members=True
-    )
+    channel_name = await config.channels.channel_name(channel)
 
-    channel_name = channel_name_checking_response["channel"]["name"]
-
-    if channel_name == "randomizer":
+    if channel_name == settings.RANDOMIZER_CHANNEL_NAME:
         await config.web_client.chat_postMessage(
             channel=channel,
             text=f"Hi <@{user_id}>! Please give us some time to run the randomizer algorithm...",
         )
 
-        channel_members_response = await config.web_client.conversations_members(
-            channel=channel, limit=1000
-        )
-
-        channel_members = channel_members_response["members"]
+        # Leave out organizers, admin and the bot itself
+        excluded = {settings.MASTER_ID, settings.BOT_ID, *settings.ORGANIZER_IDS}
 
-        # Remove organizers, admin and the bot itself from the list
-        channel_members.remove(settings.MASTER_ID)
-        channel_members.remove(settings.BOT_ID)
-        for organizer_id in settings.ORGANIZER_IDS:
-            channel_members.remove(organizer_id)
+        channel_members = [
+            member
+            async for member in channels.channel_members(
+                config.web_client, channel, excluded
+            )
+        ]
 
         groups = list(get_random_groupings(channel_members))
 
@@ -62,20 +57,26 @@ async def randomizer(payload):
             ),
         )
 
+        tavern_channel = await config.channels.mention(settings.TAVERN_CHANNEL_NAME)
+
         await config.web_client.chat_postMessage(
             channel=channel,
             text=(
                 "Do note that the randomized groupings are not confirmed yet. "
                 "Please communicate and coordinate with your randomly assigned new teammates to get to know each other more and check whether all of you accept this grouping or not. "
                 "After that, do collectively decide and agree on the group particulars, assign a group leader, and register in the official form accordingly.\r\n\r\n"
-                f"If you feel that your randomly assigned group is not the best fit for you, feel free to go to the <#{settings.TAVERN_CHANNEL_ID}> and talk to other people to form groups!"
+                f"If you feel that your randomly assigned group is not the best fit for you, feel free to go to the {tavern_channel} and talk to other people to form groups!"
             ),
         )
 
     else:
+        randomizer_channel = await config.channels.mention(
+            settings.RANDOMIZER_CHANNEL_NAME
+        )
+
         await config.web_client.chat_postMessage(
             channel=channel,
-            text=f"Hi <@{user_id}>! Please run this command in the <#{settings.RANDOMIZER_CHANNEL_ID}> channel. Thank you!",
+            text=f"Hi <@{user_id}>! Please run this command in the {randomizer_channel} channel. Thank you!",
         )
 
     return
@@ -9,8 +9,10 @@ import json
 import config
 
 from slackers.hooks import events, actions
+from dispatch import when, is_thread_reply, replies_to, has_subtype, in_channels
 
 conv_db = config.conv_handler
+async_conv_db = config.async_conv_handler
 
 
 # This will run if there are no remarks submitted
@@ -18,9 +20,10 @@ conv_db = config.conv_handler
 def finalize_judging(payload):
     channel = payload["channel"]["id"]
     user_id = payload["user"]["id"]
-    state = conv_db.get_state(channel, user_id)
-
-    if state != config.TEAM_REMARKS:
+    # End the conversation right away so that only one of several clicks finalizes it
+    if not conv_db.transition(
+        channel, user_id, (config.TEAM_REMARKS,), config.CONVERSATION_END
+    ):
         config.web_client.chat_postMessage(
             channel=channel,
             text=f"You can only execute this command after submitting scores as a judge, <@{user_id}>!",
@@ -33,72 +36,97 @@ def finalize_judging(payload):
             channel=channel, text=message, ts=latest_message_ts, blocks=None
         )
 
-        conv_db.change_state(channel, user_id, config.CONVERSATION_END)
-
     return
 
 
 # Final stage of judging
+# Only threaded replies to the bot in the judging channels are looked at, so other messages never reach the conversation store
 @events.on("message")
+@when(
+    is_thread_reply,
+    replies_to(settings.BOT_ID),
+    has_subtype(None, "file_share", "thread_broadcast"),
+    in_channels(settings.JUDGING_CHANNEL_IDS),
+)
 async def handle_remarks(payload):
     channel = payload["event"]["channel"]
     user_id = payload["event"].get("user")
-    ts = conv_db.get_ts(channel, user_id)
+    ts = await async_conv_db.get_ts(channel, user_id)
 
-    # Filter only threaded replies of the correct parent timestamp that contain images
-    if (
-        (payload["event"].get("parent_user_id") == settings.BOT_ID)
-        and (payload["event"].get("thread_ts") == ts)
-    ):
-        if user_id in config.db.get_all_judges():
-            state = conv_db.get_state(channel, user_id)
+    # Filter only threaded replies of the correct parent timestamp
+    if payload["event"].get("thread_ts") == ts:
+        if await config.async_db.is_judge(user_id):
+            state = await async_conv_db.get_state(channel, user_id)
 
             # Validate state
             if (state == config.TEAM_REMARKS) or (state == config.EDIT_REMARKS):
-                # Store image URL and textual remarks in workspace to database
-                # Image URL is still valid even after message deletion
-                text = (
-                    await config.web_client.conversations_history(
-                        channel=channel, latest=ts, limit=1, inclusive=1
-                    )
-                )["messages"][0]["blocks"][0]["text"]["text"]
-                group_name = text.split(": *", 1)[1].rsplit("*!", 1)[0]
-                group_id = config.db.get_group_id(group_name)
+                # Claim the end of the conversation first so that a retried delivery of the same reply is not stored twice
+                if not await async_conv_db.transition(
+                    channel, user_id, (state,), config.CONVERSATION_END
+                ):
+                    return
+
                 try:
-                    if ("files" in payload["event"]) and (payload["event"].get("subtype") == "file_share"):
-                        url = payload["event"]["files"][0]["url_private"]
+                    # Store image URL and textual remarks in workspace to database
+                    # Image URL is still valid even after message deletion
+                    remark = await async_conv_db.get_remark(channel, user_id)
+
+                    if remark is not None:
+                        group_id = remark["group_id"]
+
+                    # Remark threads opened before the remark context was stored only have the group name in the parent message
                     else:
+                        text = (
+                            await config.web_client.conversations_history(
+                                channel=channel, latest=ts, limit=1, inclusive=1
+                            )
+                        )["messages"][0]["blocks"][0]["text"]["text"]
+                        group_name = text.split(": *", 1)[1].rsplit("*!", 1)[0]
+                        group_id = await config.async_db.get_group_id(group_name)
+                    try:
+                        if ("files" in payload["event"]) and (payload["event"].get("subtype") == "file_share"):
+                            url = payload["event"]["files"][0]["url_private"]
+                        else:
+                            url = None
+                    except KeyError:
                         url = None
-                except KeyError:
-                    url = None
-                try:
-                    if ("text" in payload["event"]) and payload["event"]["text"]:
-                        remarks_text = payload["event"]["text"]
-                    else:
+                    try:
+                        if ("text" in payload["event"]) and payload["event"]["text"]:
+                            remarks_text = payload["event"]["text"]
+                        else:
+                            remarks_text = None
+                    except KeyError:
                         remarks_text = None
-                except KeyError:
-                    remarks_text = None
 
-                # Add filepath location and textual remarks to score table
-                config.db.update_remarks(user_id, group_id, url, remarks_text)
-
-                # Update parent message
-                if state == config.TEAM_REMARKS:
-                    config.web_client.chat_update(
-                        channel=channel,
-                        text=f"Remarks received! Your judging process has been finalized, <@{user_id}>!",
-                        blocks=None,
-                        ts=conv_db.get_ts(channel, user_id),
+                    # Add filepath location and textual remarks to score table
+                    await config.async_db.update_remarks(user_id, group_id, url, remarks_text)
+
+                    # Update parent message
+                    if state == config.TEAM_REMARKS:
+                        config.web_client.chat_update(
+                            channel=channel,
+                            text=f"Remarks received! Your judging process has been finalized, <@{user_id}>!",
+                            blocks=None,
+                            ts=ts,
+                        )
+                    elif state == config.EDIT_REMARKS:
+                        config.web_client.chat_update(
+                            channel=channel,
+                            text=f"Remarks received! Your editing process has been finalized, <@{user_id}>!",
+                            blocks=None,
+                            ts=ts,
+                        )
+
+                # Give the claim back if the remarks could not be stored, so that the judge can reply again instead of losing the remarks
+                except Exception:
+                    await async_conv_db.transition(
+                        channel, user_id, (config.CONVERSATION_END,), state
                     )
-                elif state == config.EDIT_REMARKS:
-                    config.web_client.chat_update(
+                    config.web_client.chat_postMessage(
                         channel=channel,
-                        text=f"Remarks received! Your editing process has been finalized, <@{user_id}>!",
-                        blocks=None,
-                        ts=conv_db.get_ts(channel, user_id),
+                        text=f"Hi <@{user_id}>! It seems that something went wrong while storing your remarks. Please reply to the same message again. Apologies!",
                     )
-
-                conv_db.change_state(channel, user_id, config.CONVERSATION_END)
+                    raise
 
             else:
                 config.web_client.chat_postMessage(
@@ -9,22 +9,23 @@ import config
 from slackers.hooks import actions
 
 conv_db = config.conv_handler
+async_conv_db = config.async_conv_handler
 
 
 # Second stage of judging
 @actions.on("block_actions:team_choice")
-def score_team(payload):
+async def score_team(payload):
     user_id = payload["user"]["id"]
     channel = payload["view"]["private_metadata"]
     view_id = payload["view"]["id"]
     selected_team = payload["actions"][0]["selected_option"]["value"]
     action_id = payload["actions"][0]["action_id"]
 
-    if user_id in config.db.get_all_judges():
-        state = conv_db.get_state(channel, user_id)
-
-        # Validate action id and state
-        if (str(action_id) == "team_choice") and (state == config.TEAM_CHOOSE):
+    if await config.async_db.is_judge(user_id):
+        # Validate action id and state, moving on to the next state at the same time
+        if (str(action_id) == "team_choice") and await async_conv_db.transition(
+            channel, user_id, (config.TEAM_CHOOSE,), config.TEAM_SCORE
+        ):
             scoring_block = [
                 {
                     "type": "section",
@@ -35,7 +36,7 @@ def score_team(payload):
                 }
             ]
 
-            judged_categories = config.db.get_categories(user_id, selected_team)
+            judged_categories = await config.async_db.get_categories(user_id, selected_team)
 
             for category in judged_categories:
                 category_block = [
@@ -68,7 +69,7 @@ def score_team(payload):
                 scoring_block.extend(category_block)
 
             try:
-                config.web_client.views_update(
+                await config.web_client.views_update(
                     view_id=view_id,
                     view={
                         "type": "modal",
@@ -95,21 +96,13 @@ def score_team(payload):
                     },
                 )
 
-                conv_db.change_state(channel, user_id, config.TEAM_SCORE)
-
             except slack.errors.SlackApiError as e:
                 config.web_client.chat_postMessage(
                     channel=channel,
                     text=f"Hi <@{user_id}>! It seems that something went wrong. Feel free to retry the judging process. Apologies!",
                 )
 
-                status = config.db.check_score_existence(user_id)
-
-                # Reset state
-                if status:
-                    conv_db.change_state(channel, user_id, config.CONVERSATION_END)
-                else:
-                    conv_db.change_state(channel, user_id, config.INITIAL_STATE)
+                await async_conv_db.release(channel, user_id)
 
         else:
             config.fallback.view_fallback(payload)
@@ -129,12 +122,8 @@ def score_team(payload):
 def cancel_score_selection(payload):
     user_id = payload["user"]["id"]
     channel = payload["view"]["private_metadata"].split(", ")[0]
-    status = config.db.check_score_existence(user_id)
 
-    if status:
-        conv_db.change_state(channel, user_id, config.CONVERSATION_END)
-    else:
-        conv_db.change_state(channel, user_id, config.INITIAL_STATE)
+    conv_db.release(channel, user_id)
 
     config.web_client.chat_postMessage(
         channel=channel,
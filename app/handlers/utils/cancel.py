@@ -9,17 +9,18 @@ import settings
 from slackers.hooks import commands, actions
 
 conv_db = config.conv_handler
+async_conv_db = config.async_conv_handler
 
 
 # Receive slash command
 @commands.on("cancel")
-def cancel(payload):
+async def cancel(payload):
     channel = payload["channel_id"]
     user_id = payload["user_id"]
     trigger_id = payload["trigger_id"]
 
-    if user_id in config.db.get_all_judges():
-        state = conv_db.get_state(channel, user_id)
+    if await config.async_db.is_judge(user_id):
+        state = await async_conv_db.get_state(channel, user_id)
 
         if (state == config.TEAM_REMARKS) or (state == config.EDIT_REMARKS):
             config.web_client.chat_postMessage(
@@ -29,7 +30,7 @@ def cancel(payload):
 
         elif (state != config.INITIAL_STATE) or (state != config.CONVERSATION_END):
             try:
-                config.web_client.views_open(
+                await config.web_client.views_open(
                     trigger_id=trigger_id,
                     view={
                         "type": "modal",
@@ -82,12 +83,8 @@ def cancel(payload):
 def destroy_conversation(payload):
     user_id = payload["user"]["id"]
     channel = payload["view"]["private_metadata"]
-    status = config.db.check_score_existence(user_id)
 
-    if status:
-        conv_db.change_state(channel, user_id, config.CONVERSATION_END)
-    else:
-        conv_db.change_state(channel, user_id, config.INITIAL_STATE)
+    conv_db.release(channel, user_id)
 
     config.web_client.chat_postMessage(
         channel=channel,
@@ -0,0 +1,37 @@
+# coding: utf-8
+# Keep the channel directory up to date with the channels created, renamed, archived and deleted in the workspace
+
+import config
+
+from slackers.hooks import events
+
+
+@events.on("channel_created")
+@events.on("channel_rename")
+@events.on("group_rename")
+async def update_channel(payload):
+    channel = payload["event"]["channel"]
+    config.channels.add(channel["id"], channel["name"])
+
+    return
+
+
+@events.on("channel_archive")
+@events.on("channel_deleted")
+@events.on("group_archive")
+@events.on("group_deleted")
+async def remove_channel(payload):
+    config.channels.remove(payload["event"]["channel"])
+
+    return
+
+
+# Unarchive events only come with the channel ID
+@events.on("channel_unarchive")
+@events.on("group_unarchive")
+async def restore_channel(payload):
+    channel_id = payload["event"]["channel"]
+    response = await config.web_client.conversations_info(channel=channel_id)
+    config.channels.add(channel_id, response["channel"]["name"])
+
+    return
@@ -3,7 +3,6 @@
 # Created by James Raphael Tiovalen (2020)
 
 import slack
-import ast
 import settings
 import config
 
@@ -12,14 +11,14 @@ from slackers.hooks import commands
 conv_db = config.conv_handler
 
 
-def init(category):
-    board = ast.literal_eval(config.db.build_leaderboard(category))
+def init(board):
     field = []
-    for i in range(len(board)):
-        name = board[i][0]
-        score = round(board[i][1], settings.SCORE_DECIMAL_LIMIT)
+    for entry in board:
+        score = round(entry.score, settings.SCORE_DECIMAL_LIMIT)
 
-        field.append({"type": "mrkdwn", "text": f"*{str(name)} - {str(score)}*"})
+        field.append(
+            {"type": "mrkdwn", "text": f"*{str(entry.group_name)} - {str(score)}*"}
+        )
 
     # Check if there are no scores available for a particular category
     if not field:
@@ -49,54 +48,39 @@ def leaderboard(payload):
 
         else:
             limit = settings.MAX_LEADERBOARD_ENTRIES_PER_CATEGORY_LIMIT
-            # Max no. of "fields" is 10, which is a Slack API limitation
-            config.web_client.chat_postMessage(
-                channel=channel,
-                blocks=[
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": f"Hello <@{user_id}>!\r\nThis is the Top {limit} Leaderboard so far:",
-                        },
-                    },
-                    {"type": "divider"},
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": f"*{settings.CATEGORIES[0]} Category:*",
-                        },
-                    },
-                    {"type": "section", "fields": init(settings.CATEGORIES[0])[:limit]},
-                    {"type": "divider"},
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": f"*{settings.CATEGORIES[1]} Category:*",
-                        },
+            leaderboards = config.db.build_all_leaderboards(limit)
+
+            leaderboard_blocks = [
+                {
+                    "type": "section",
+                    "text": {
+                        "type": "mrkdwn",
+                        "text": f"Hello <@{user_id}>!\r\nThis is the Top {limit} Leaderboard so far:",
                     },
-                    {"type": "section", "fields": init(settings.CATEGORIES[1])[:limit]},
-                    {"type": "divider"},
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": f"*{settings.CATEGORIES[2]} Category:*",
+                },
+            ]
+
+            for category in settings.CATEGORIES:
+                leaderboard_blocks.extend(
+                    [
+                        {"type": "divider"},
+                        {
+                            "type": "section",
+                            "text": {
+                                "type": "mrkdwn",
+                                "text": f"*{category} Category:*",
+                            },
                         },
-                    },
-                    {"type": "section", "fields": init(settings.CATEGORIES[2])[:limit]},
-                    {"type": "divider"},
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": f"*{settings.CATEGORIES[3]} Category:*",
+                        # Max no. of "fields" is 10, which is a Slack API limitation
+                        {
+                            "type": "section",
+                            "fields": init(leaderboards[category])[:limit],
                         },
-                    },
-                    {"type": "section", "fields": init(settings.CATEGORIES[3])[:limit]},
-                ],
+                    ]
+                )
+
+            config.web_client.chat_postMessage(
+                channel=channel, blocks=leaderboard_blocks
             )
 
     else:
@@ -107,3 +91,35 @@ def leaderboard(payload):
         )
 
     return
+
+
+# Rebuild the incrementally-maintained leaderboard aggregates from the raw scores and report any drift
+# Run this once after deploying the aggregate table on an existing database
+@commands.on("checkleaderboard")
+def check_leaderboard(payload):
+    channel = payload["channel_id"]
+    user_id = payload["user_id"]
+
+    if user_id == settings.MASTER_ID:
+        drift = config.db.rebuild_score_aggregates()
+
+        if not drift:
+            message = f"Hello <@{user_id}>! The leaderboard aggregates are consistent with the submitted scores."
+
+        else:
+            drift_lines = "\r\n".join(
+                f"• *{group_name}* ({category_name}): expected {expected}, found {actual}"
+                for group_name, category_name, expected, actual in drift
+            )
+            message = f"Hello <@{user_id}>! {len(drift)} leaderboard aggregate(s) drifted from the submitted scores and have been rebuilt (criteria sums and judge count):\r\n\r\n{drift_lines}"
+
+        config.web_client.chat_postMessage(channel=channel, text=message)
+
+    else:
+        print(f"Unauthorized access denied for user {user_id}.")
+        config.web_client.chat_postMessage(
+            channel=channel,
+            text=f"Hi <@{user_id}>! You do not seem to have enough privileges to execute that command. Apologies!\r\n",
+        )
+
+    return
@@ -4,22 +4,22 @@
 
 import slack
 import ast
-import settings
 import config
 
 from slackers.hooks import commands
+from handlers.viewing.summary_blocks import summary_entries, chunk_blocks
 
-conv_db = config.conv_handler
+async_conv_db = config.async_conv_handler
 
 
 @commands.on("summary")
-def summary(payload):
+async def summary(payload):
     channel = payload["channel_id"]
     user_id = payload["user_id"]
     trigger_id = payload["trigger_id"]
 
-    if user_id in config.db.get_all_judges():
-        state = conv_db.get_state(channel, user_id)
+    if await config.async_db.is_judge(user_id):
+        state = await async_conv_db.get_state(channel, user_id)
 
         if (state == config.TEAM_REMARKS) or (state == config.EDIT_REMARKS):
             config.web_client.chat_postMessage(
@@ -28,90 +28,29 @@ def summary(payload):
             )
 
         elif (state != config.INITIAL_STATE) or (state != config.CONVERSATION_END):
-            presence_of_scores = False
             try:
-                # Prepare scoreboard
-                content = [
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": f"Hello <@{user_id}>, this is your current scoring summary table so far:",
-                        },
-                    },
-                    {"type": "divider"},
-                ]
-                # Only create a table for the categories that the judge has submitted
-                for category in config.db.get_judged_categories(user_id):
-                    category_name = config.db.get_category_name(category)
-                    scoreboard = config.db.get_all_scores(user_id, category_name)
-                    if scoreboard:
-                        presence_of_scores = True
-                    content.extend(
+                scores = await config.async_db.get_score_summary(user_id)
+
+                if scores:
+                    messages = chunk_blocks(summary_entries(user_id, scores))
+                else:
+                    messages = [
                         [
                             {
-                            "type": "section",
-                            "text": {
-                                "type": "mrkdwn",
-                                "text": f"*{category_name}* Category",
+                                "type": "section",
+                                "text": {
+                                    "type": "mrkdwn",
+                                    "text": f"Hello <@{user_id}>, you do not have any submitted scores yet. Submit a judging score to get started!",
                                 },
                             },
-                            {"type": "divider"}
                         ]
-                        
-                    )
-                    for idx, score in enumerate(scoreboard):
-                        group_name = config.db.get_group_name(score[0])
-                        content.append(
-                                {
-                                    "type": "section",
-                                    "text": {
-                                        "type": "mrkdwn",
-                                        "text": f"*{group_name}*\r\n\r\n{settings.CRITERIAS[0]}: {score[1]}\r\n{settings.CRITERIAS[1]}: {score[2]}\r\n{settings.CRITERIAS[2]}: {score[3]}\r\n{settings.CRITERIAS[3]}: {score[4]}\r\n",
-                                    },
-                                }
-                            )
-                        # If there is remark image
-                        if score[5] is not None:
-                            content.append(
-                                    {
-                                        "type": "section",
-                                        "text": {
-                                            "type": "mrkdwn",
-                                            "text": f"Remarks image for *{group_name}* is at: {score[5]}",
-                                        },
-                                    },
-                            )
-                        # If there are textual remarks
-                        if score[6] is not None:
-                            content.append(
-                                    {
-                                        "type": "section",
-                                        "text": {
-                                            "type": "mrkdwn",
-                                            "text": f"Remarks text for *{group_name}* is: {score[6]}",
-                                        },
-                                    },
-                            )
-                        if idx != len(scoreboard) - 1:
-                            content.append({"type": "divider"})
-                    content.append({"type": "divider"})
-
-                if not presence_of_scores:
-                    content = [
-                        {
-                            "type": "section",
-                            "text": {
-                                "type": "mrkdwn",
-                                "text": f"Hello <@{user_id}>, you do not have any submitted scores yet. Submit a judging score to get started!",
-                            },
-                        },
                     ]
 
-                # Send scoreboard message
-                config.web_client.chat_postMessage(
-                    channel=channel, user=user_id, blocks=content
-                )
+                # Send scoreboard messages one after another so that they stay in order
+                for content in messages:
+                    await config.web_client.chat_postMessage(
+                        channel=channel, user=user_id, blocks=content
+                    )
 
             # Catch expired trigger_id error
             except slack.errors.SlackApiError as e:
@@ -0,0 +1,86 @@
+# coding: utf-8
+# Render the scoring summary as Slack blocks, split over as many messages as needed
+
+import itertools
+import settings
+
+
+# Yield the blocks of the scoring summary in groups that should not be split across messages
+# Only the categories that the judge has submitted scores for are listed
+def summary_entries(user_id, scores):
+    yield [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": f"Hello <@{user_id}>, this is your current scoring summary table so far:",
+            },
+        },
+        {"type": "divider"},
+    ]
+
+    for category_name, category_scores in itertools.groupby(
+        scores, key=lambda score: score[0]
+    ):
+        yield [
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"*{category_name}* Category",
+                },
+            },
+            {"type": "divider"},
+        ]
+
+        for score in category_scores:
+            group_name = score[1]
+            entry = [
+                {
+                    "type": "section",
+                    "text": {
+                        "type": "mrkdwn",
+                        "text": f"*{group_name}*\r\n\r\n{settings.CRITERIAS[0]}: {score[2]}\r\n{settings.CRITERIAS[1]}: {score[3]}\r\n{settings.CRITERIAS[2]}: {score[4]}\r\n{settings.CRITERIAS[3]}: {score[5]}\r\n",
+                    },
+                }
+            ]
+            # If there is remark image
+            if score[6] is not None:
+                entry.append(
+                    {
+                        "type": "section",
+                        "text": {
+                            "type": "mrkdwn",
+                            "text": f"Remarks image for *{group_name}* is at: {score[6]}",
+                        },
+                    }
+                )
+            # If there are textual remarks
+            if score[7] is not None:
+                entry.append(
+                    {
+                        "type": "section",
+                        "text": {
+                            "type": "mrkdwn",
+                            "text": f"Remarks text for *{group_name}* is: {score[7]}",
+                        },
+                    }
+                )
+            entry.append({"type": "divider"})
+
+            yield entry
+
+
+# Pack the entries into as few messages as possible without going over Slack's limit of blocks per message
+def chunk_blocks(entries, limit=settings.MAX_BLOCKS_PER_MESSAGE):
+    chunk = []
+
+    for entry in entries:
+        if chunk and len(chunk) + len(entry) > limit:
+            yield chunk
+            chunk = []
+
+        chunk.extend(entry)
+
+    if chunk:
+        yield chunk
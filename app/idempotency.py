@@ -0,0 +1,99 @@
+# coding: utf-8
+# Remember which Slack deliveries have been handled recently, so that redelivered events and interactions are only handled once
+# Slack retries an event (with the X-Slack-Retry-Num header) if it was not acknowledged in time
+# By default, each worker remembers its own deliveries, but the "sqlite" backend shares them between all workers on the same machine
+
+# Import libraries
+import collections
+import threading
+import time
+import typing
+
+import settings
+
+from databases.sqlitehelper import LocalSQLite
+
+
+# Return the key that identifies a delivery, or None if it cannot be told apart from a new request
+def delivery_key(kind, payload):
+    if kind == "event":
+        return f"event:{payload.event_id}"
+
+    # Every interaction (including each submission of a view) comes with its own trigger ID, so only redeliveries share one
+    # Views are not keyed on their hash, since it stays the same when a submission is rejected and the corrected one is submitted again
+    # Double submissions of the same form are stopped by the conversation state claims of the handlers instead
+    if kind == "action" and payload.trigger_id:
+        return f"{payload.type}:{payload.trigger_id}"
+
+    return None
+
+
+class Deliveries:
+    # Record the key and return whether it is new (otherwise, the delivery is a duplicate)
+    def claim(self, key):
+        raise NotImplementedError
+
+
+# Bounded in-memory cache of the delivery keys seen by this worker
+# All keys live for the same time, so the oldest key is always the first one to expire
+class MemoryDeliveries(Deliveries):
+    def __init__(self, ttl=settings.DELIVERY_TTL, max_entries=settings.DELIVERY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.expiry = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def claim(self, key):
+        now = time.monotonic()
+
+        with self.lock:
+            while self.expiry and next(iter(self.expiry.values())) <= now:
+                self.expiry.popitem(last=False)
+
+            if key in self.expiry:
+                return False
+
+            self.expiry[key] = now + self.ttl
+            if len(self.expiry) > self.max_entries:
+                self.expiry.popitem(last=False)
+
+            return True
+
+
+# Delivery keys kept in a local SQLite database in WAL mode, so that a retry that reaches another worker is also recognized
+class SQLiteDeliveries(Deliveries):
+    def __init__(self, ttl=settings.DELIVERY_TTL, path=settings.DELIVERY_SQLITE_PATH):
+        self.ttl = ttl
+        self.path = path
+        self.database = LocalSQLite(path)
+
+        connection = self.connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS delivery (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS ix_delivery_expires_at ON delivery (expires_at)"
+        )
+
+    def connection(self):
+        return self.database.connection()
+
+    def claim(self, key):
+        connection = self.connection()
+        now = time.time()
+
+        connection.execute("DELETE FROM delivery WHERE expires_at <= ?", (now,))
+
+        return (
+            connection.execute(
+                "INSERT INTO delivery (key, expires_at) VALUES (?, ?) ON CONFLICT (key) DO NOTHING",
+                (key, now + self.ttl),
+            ).rowcount
+            == 1
+        )
+
+
+DELIVERY_BACKENDS: typing.Dict[str, typing.Type[Deliveries]] = {
+    "memory": MemoryDeliveries,
+    "sqlite": SQLiteDeliveries,
+}
@@ -13,13 +13,14 @@ See here for more info: https://github.com/slackapi/python-slack-events-api/issu
 """
 
 # Import libraries
+import asyncio
 import time
 import requests
 import json
 import settings
 
 from fastapi import FastAPI
-from slackers.server import router
+from dispatch import router, AckTimer
 
 # Import global variables across modules
 import config
@@ -27,9 +28,13 @@ import config
 # Import handlers
 import handlers.utils.start
 import handlers.utils.cancel
+import handlers.utils.channels
 import handlers.admin.find_assigned_group
 import handlers.admin.view_self_group_id
 import handlers.admin.view_self_participant_id
+import handlers.admin.view_pool_stats
+import handlers.admin.warm_up_conversations
+import handlers.admin.view_ack_stats
 import handlers.housekeeping.add_group
 import handlers.housekeeping.add_judge
 import handlers.housekeeping.add_participant
@@ -62,3 +67,69 @@ app = FastAPI(openapi_url=None, docs_url=None, redoc_url=None)
 app.include_router(
     router, prefix=f"/{settings.SECRET_KEY}"
 )  # Protect the endpoint with the SECRET_KEY
+
+# Measure how long it takes to acknowledge each Slack request
+app.add_middleware(AckTimer)
+
+
+# Calls to the Web API made by sync handlers (which run in threads) are scheduled on the loop that serves the requests
+@app.on_event("startup")
+async def attach_web_client():
+    config.web_client.attach(asyncio.get_event_loop())
+
+
+# Initialize the judges' conversations in the background, since they would otherwise be initialized on demand anyway
+# Conversations shared between workers are initialized once per deployment by migrate.py instead
+@app.on_event("startup")
+async def warm_up_conversations():
+    if settings.CONVERSATION_BACKEND != "memory":
+        return
+
+    async def warm_up():
+        loop = asyncio.get_event_loop()
+        try:
+            seeded = await loop.run_in_executor(None, config.warm_up_conversations)
+            config.logger.info(f"Initialized {seeded} judge conversation(s).")
+        except Exception as e:
+            config.logger.error(f"Failed to initialize the judge conversations: {e}")
+
+    asyncio.ensure_future(warm_up())
+
+
+# Periodically clean up the conversation store, so that it stays small throughout a multi-day event
+# Every worker keeps trying, so that another worker takes over if the one sweeping stops
+@app.on_event("startup")
+async def sweep_conversations():
+    async def sweep():
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(settings.CONVERSATION_SWEEP_INTERVAL)
+            try:
+                swept = await loop.run_in_executor(None, config.sweep_conversations)
+                if swept is None:
+                    continue
+
+                expired, reset = swept
+                config.logger.info(
+                    f"Swept {expired} expired and {reset} abandoned conversation(s)."
+                )
+            except Exception as e:
+                config.logger.error(f"Failed to sweep the conversations: {e}")
+
+    asyncio.ensure_future(sweep())
+
+
+# Build the channel directory and rebuild it periodically, since the channel events only reach one of the workers
+@app.on_event("startup")
+async def refresh_channel_directory():
+    async def refresh():
+        while True:
+            try:
+                count = await config.channels.refresh()
+                config.logger.info(f"Loaded {count} channel(s) into the directory.")
+            except Exception as e:
+                config.logger.error(f"Failed to load the channel directory: {e}")
+
+            await asyncio.sleep(settings.CHANNEL_DIRECTORY_REFRESH_INTERVAL)
+
+    asyncio.ensure_future(refresh())
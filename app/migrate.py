@@ -0,0 +1,32 @@
+# coding: utf-8
+# Apply pending database schema migrations
+# Run this once per deployment (from the app folder as the current working directory) before starting the bot's workers
+
+# Import libraries
+import logging
+
+import config
+import settings
+from databases.migrations import migrate
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    applied = migrate(config.db)
+
+    if applied:
+        print(f"Applied migration(s): {', '.join(str(version) for version in applied)}")
+    else:
+        print("Database schema is already up to date.")
+
+    # Move any conversations stored in the old single-document-per-channel Firestore layout
+    if settings.CONVERSATION_BACKEND == "firestore":
+        migrated = config.conv_handler.migrate_legacy_layout()
+        print(f"Migrated {migrated} conversation record(s) to the per-user Firestore layout.")
+
+    # Initialize the judges' conversations once per deployment instead of in every worker
+    # The "memory" backend lives in each worker's own memory, so its workers initialize their conversations themselves
+    if settings.CONVERSATION_BACKEND != "memory":
+        seeded = config.warm_up_conversations()
+        print(f"Initialized {seeded} judge conversation(s).")
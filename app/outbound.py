@@ -0,0 +1,200 @@
+# coding: utf-8
+# Outbound gateway for all Slack Web API calls of the bot
+# Calls are queued per Web API method (according to its rate limit tier) or per channel for messages, and rate-limited calls are retried after the Retry-After delay
+# Every call is scheduled right away and returns an awaitable task, so async handlers can await the result and sync handlers can leave it running
+# Sync handlers run in threads, so their calls are handed over to the event loop that the gateway is attached to (and return a concurrent future instead)
+
+# Import libraries
+import asyncio
+import logging
+
+import aiohttp
+import slack
+import settings
+
+logger = logging.getLogger(__name__)
+
+# Requests per minute allowed for each rate limit tier of the Web API (per workspace)
+# Read more here: https://api.slack.com/docs/rate-limits
+TIER_LIMITS = {1: 1, 2: 20, 3: 50, 4: 100}
+
+# Rate limit tiers of the methods used by the bot (other methods are assumed to be in tier 3)
+# chat.postMessage is not in a tier, since Slack limits it per channel instead
+METHOD_TIERS = {
+    "chat_postEphemeral": 4,
+    "chat_update": 3,
+    "chat_delete": 3,
+    "conversations_create": 2,
+    "conversations_history": 3,
+    "conversations_info": 3,
+    "conversations_invite": 3,
+    "conversations_list": 2,
+    "conversations_members": 4,
+    "users_info": 4,
+    "views_open": 4,
+    "views_push": 4,
+    "views_update": 4,
+}
+
+# Messages are limited to about 1 per second for each channel (with short bursts allowed)
+CHANNEL_MESSAGES_PER_MINUTE = 60
+CHANNEL_BURST = 3
+
+# Views have to be opened within 3 seconds of the interaction that triggered them, so they are never held back in advance
+# They are only held back after Slack has rate-limited them
+TRIGGER_METHODS = ("views_open", "views_push", "views_update")
+
+# Methods that would post or create twice if a call that reached Slack was retried
+# These are only retried if the connection could not be established in the first place
+NON_IDEMPOTENT_METHODS = (
+    "chat_postMessage",
+    "chat_postEphemeral",
+    "conversations_create",
+    "views_open",
+    "views_push",
+)
+
+
+# Spaces out calls so that no more than burst calls are made at once and the average rate stays within the limit
+# Callers are let through in the order that they arrived (this is a generic cell rate algorithm)
+class RateLimiter:
+    def __init__(self, per_minute, burst):
+        self.interval = 60 / per_minute
+        self.burst = burst
+        self.theoretical_arrival = 0.0
+        self.paused_until = 0.0
+
+    async def acquire(self):
+        now = asyncio.get_event_loop().time()
+        self.theoretical_arrival = max(self.theoretical_arrival, now) + self.interval
+
+        delay = self.theoretical_arrival - now - self.burst * self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    # Only wait for the end of a pause, without spacing out calls
+    async def resume(self):
+        delay = self.paused_until - asyncio.get_event_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    # Hold back every call for the given number of seconds
+    def pause(self, seconds):
+        now = asyncio.get_event_loop().time()
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.theoretical_arrival = max(
+            self.theoretical_arrival, now + seconds + (self.burst - 1) * self.interval
+        )
+
+
+class SlackGateway:
+    def __init__(self, client, workers=settings.SLACK_RATE_LIMIT_WORKERS):
+        self.client = client
+        self.workers = workers
+        self.method_limiters = {}
+        self.channel_limiters = {}
+        self.loop = None
+
+    # Attach the gateway to the event loop that serves the requests, so that calls made from other threads are scheduled on it
+    def attach(self, loop):
+        self.loop = loop
+
+    # Calls made on the attached loop (or without one) become tasks, while calls made from other threads are handed over to the attached loop
+    def schedule(self, coroutine):
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if (self.loop is not None) and (running_loop is not self.loop):
+            return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+        return asyncio.ensure_future(coroutine)
+
+    # Each worker gets an equal share of the workspace's rate limit of the method
+    def method_limiter(self, method):
+        if method not in self.method_limiters:
+            per_minute = TIER_LIMITS[METHOD_TIERS.get(method, 3)]
+            self.method_limiters[method] = RateLimiter(
+                per_minute / self.workers, max(1, per_minute // (10 * self.workers))
+            )
+
+        return self.method_limiters[method]
+
+    def channel_limiter(self, channel):
+        if channel not in self.channel_limiters:
+            self.channel_limiters[channel] = RateLimiter(
+                CHANNEL_MESSAGES_PER_MINUTE, CHANNEL_BURST
+            )
+
+        return self.channel_limiters[channel]
+
+    # Messages are held back per channel and all other calls per method
+    def limiter(self, method, kwargs):
+        if (method == "chat_postMessage") and ("channel" in kwargs):
+            return self.channel_limiter(kwargs["channel"])
+
+        return self.method_limiter(method)
+
+    async def call(self, method, **kwargs):
+        limiter = self.limiter(method, kwargs)
+
+        for attempt in range(settings.SLACK_MAX_RETRIES + 1):
+            if method in TRIGGER_METHODS:
+                await limiter.resume()
+            else:
+                await limiter.acquire()
+
+            try:
+                return await getattr(self.client, method)(**kwargs)
+
+            except slack.errors.SlackApiError as e:
+                if (e.response.status_code != 429) or (
+                    attempt == settings.SLACK_MAX_RETRIES
+                ):
+                    raise
+
+                # Hold back all calls of this method (or to this channel) for as long as Slack asks
+                retry_after = float(e.response.headers.get("Retry-After", 1))
+                logger.warning(f"Rate-limited on {method}, retrying in {retry_after}s.")
+                limiter.pause(retry_after)
+
+            # The request was never sent, so it is safe to retry any method
+            except aiohttp.ClientConnectorError as e:
+                if attempt == settings.SLACK_MAX_RETRIES:
+                    raise
+
+                logger.warning(f"Failed to connect for {method} ({e}), retrying.")
+                await asyncio.sleep(2 ** attempt)
+
+            # The request might have reached Slack already
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if (method in NON_IDEMPOTENT_METHODS) or (
+                    attempt == settings.SLACK_MAX_RETRIES
+                ):
+                    raise
+
+                logger.warning(f"Failed to call {method} ({e}), retrying.")
+                await asyncio.sleep(2 ** attempt)
+
+    @staticmethod
+    def log_failure(task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Slack API call failed: {task.exception()}")
+
+    # Expose the Web API methods of the client (such as chat_postMessage) as queued calls
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        if not callable(method):
+            return method
+
+        def queued_method(**kwargs):
+            task = self.schedule(self.call(name, **kwargs))
+            task.add_done_callback(self.log_failure)
+            return task
+
+        # Cache the wrapper so that __getattr__ is only called once per method
+        setattr(self, name, queued_method)
+
+        return queued_method
@@ -12,29 +12,109 @@ OAUTH_KEY = "xoxp-..."
 os.environ["SLACK_SIGNING_SECRET"] = ""
 REQUEST_URL = ""
 
+# Slack requests have to be acknowledged within 3 seconds, so acknowledgements slower than this (in seconds) are logged as warnings
+ACK_SLOW_THRESHOLD = 1.0
+
+# Redelivered events and resubmitted views are ignored if they arrive within this many seconds of the original delivery
+DELIVERY_TTL = 10 * 60
+
+# Maximum number of recent deliveries remembered by each worker with the "memory" backend
+DELIVERY_MAX_ENTRIES = 10000
+
+# Where recent deliveries are remembered ("memory" for each worker on its own or "sqlite" for all workers on the same machine)
+DELIVERY_BACKEND = "memory"
+
+# Database file used by the "sqlite" delivery backend
+DELIVERY_SQLITE_PATH = "deliveries.sqlite3"
+
+# Number of workers sharing the workspace's Slack Web API rate limits (this should match the number of gunicorn workers)
+SLACK_RATE_LIMIT_WORKERS = 4
+
+# Maximum number of retries of a Slack Web API call that was rate-limited or could not connect
+SLACK_MAX_RETRIES = 3
+
 # Special characters would need to be escaped by following the ASCII URL Encoding Reference
 DB_URL = "<rdbms>+<library>://<username>:<password>@<server>:<port>/sutdwth"
 
+# Connection pool settings of each worker process
+# Keep DB_POOL_SIZE + DB_MAX_OVERFLOW (times the number of gunicorn workers) below MySQL's max_connections
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 10
+# Seconds to wait for a free connection before giving up
+DB_POOL_TIMEOUT = 30
+# Recycle connections before MySQL's wait_timeout closes them on the server side
+DB_POOL_RECYCLE = 3600
+# Test connections for liveness upon each checkout
+DB_POOL_PRE_PING = True
+# Checkouts that wait longer than this (in seconds) are logged as warnings
+DB_POOL_SLOW_CHECKOUT = 0.1
+
 # DB_USER = os.environ["DB_USER"]
 # DB_PASS = os.environ["DB_PASS"]
 
+# Maximum age (in seconds) of the in-process group/category name <-> UUID lookup caches
+# Writes done through the bot invalidate the caches immediately, this only bounds staleness from external writers
+LOOKUP_CACHE_TTL = 300
+
+# Maximum age (in seconds) of the in-process judge roster used for authorization checks
+# Judges added or removed through the bot take effect immediately, this only bounds staleness from external writers
+JUDGE_ROSTER_TTL = 60
+
+# Number of threads that async handlers use to run database queries without blocking the event loop (per worker)
+DB_EXECUTOR_WORKERS = 5
+
+# Number of threads that sync handlers are run in, so that their blocking calls do not hold up the acknowledgement of other requests (per worker)
+# Every thread might hold a database connection, so keep DB_EXECUTOR_WORKERS + HANDLER_EXECUTOR_WORKERS within DB_POOL_SIZE + DB_MAX_OVERFLOW
+HANDLER_EXECUTOR_WORKERS = 10
+
+# Maximum age (in seconds) of the in-process copy of a user's conversation state and message timestamp (per worker)
+# Keep this short, since consecutive requests of the same user might be handled by different workers
+CONVERSATION_CACHE_TTL = 2
+
 # Use this to manage bot-user conversations (instead of a multiprocessing.Manager)
 # Read this for more info: https://stackoverflow.com/a/32825482
 # Set environment variable to the path of Firestore JSON Service Account Certificate
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "sample-firestore-authfile.json"
 
+# Where the judging conversations are tracked: "firestore" (shared by all workers), "sqlite" (shared by the workers on one machine)
+# or "memory" (per worker, only meant for development and load testing with a single worker)
+CONVERSATION_BACKEND = "firestore"
+
+# Database file used by the "sqlite" conversation backend
+CONVERSATION_SQLITE_PATH = "conversations.sqlite3"
+
+# Conversations that have not been updated for this long (in seconds) are deleted, and start over from their initial state when used again
+CONVERSATION_TTL = 2 * 24 * 60 * 60
+
+# Conversations stuck at choosing or scoring a team for this long (in seconds) are considered abandoned and reset to their initial state
+CONVERSATION_ABANDONED_TTL = 30 * 60
+
+# How often (in seconds) the expired and abandoned conversations are swept (by a single worker, see config.py)
+CONVERSATION_SWEEP_INTERVAL = 10 * 60
+
 # Need to make these dynamic and editable from year to year instead of hardcoded (input using bash script provided)
 # Note that these are user IDs (even for the bot), instead of bot/team/channel/enterprise IDs
 BOT_ID = ""
 MASTER_ID = ""
 ORGANIZER_IDS = []
 
-# This hardcoding method is hacky and stupid, but there is no Slack API endpoint to find the channel ID by channel name
-# The alternative way is to do a for loop and check through all the channels obtained from this endpoint: https://api.slack.com/methods/conversations.list
-# However, that would be inefficient, so nope
-# It's a real shame, indeed
-TAVERN_CHANNEL_ID = ""
-RANDOMIZER_CHANNEL_ID = ""
+# Channels are referred to by name, and their IDs are looked up in the channel directory (see channels.py)
+TAVERN_CHANNEL_NAME = "tavern"
+RANDOMIZER_CHANNEL_NAME = "randomizer"
+
+# Number of channels fetched per page when building the channel directory (conversations.list allows up to 1000)
+CHANNEL_DIRECTORY_PAGE_SIZE = 1000
+
+# Number of members fetched per page when listing the members of a channel (Slack recommends no more than 200)
+CHANNEL_MEMBERS_PAGE_SIZE = 200
+
+# Interval (in seconds) between the periodic rebuilds of each worker's channel directory
+CHANNEL_DIRECTORY_REFRESH_INTERVAL = 60 * 60
+
+# Channels where the judges will run /judge and /edit
+# The judges' conversations in these channels are initialized in bulk when a worker starts (and with /warmup)
+# Remarks are also only picked up from these channels (or from every channel if this is left empty)
+JUDGING_CHANNEL_IDS = []
 
 # Define categories
 CATEGORIES = (
@@ -69,4 +149,5 @@ MAX_CRITERIA_SCORE = 100
 
 # Random constants to serve as limits due to Slack API's limitations
 NUMBER_OF_GROUPS_LIMIT = 100
+MAX_BLOCKS_PER_MESSAGE = 50
 MAX_LEADERBOARD_ENTRIES_PER_CATEGORY_LIMIT = 10
@@ -0,0 +1,87 @@
+# coding: utf-8
+# Benchmark concurrent judging submissions with blocking vs offloaded database access
+# Run this from the app folder (so that settings.py is picked up) against a populated database:
+#   python ../scripts/benchmarks/concurrent_judging.py --judges 20 --rounds 5
+# Only read queries are issued, so this is safe to run against a live database
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.getcwd())
+
+from databases.dbhelper import DBHelper, AsyncDBHelper
+
+
+# Database work done while handling one judging submission (minus the writes)
+def blocking_submission(db, judge_id):
+    db.get_pending_teams(judge_id)
+    db.check_score_existence(judge_id)
+    db.get_judged_categories(judge_id)
+
+
+async def offloaded_submission(async_db, judge_id):
+    await async_db.get_pending_teams(judge_id)
+    await async_db.check_score_existence(judge_id)
+    await async_db.get_judged_categories(judge_id)
+
+
+# Measure how late the event loop wakes up while the submissions are running
+async def monitor_loop_lag(lags, interval=0.005):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(submission, judge_ids, rounds):
+    lags = []
+    monitor = asyncio.ensure_future(monitor_loop_lag(lags))
+
+    async def judge(judge_id):
+        for _ in range(rounds):
+            await submission(judge_id)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(judge(judge_id) for judge_id in judge_ids))
+    elapsed = time.perf_counter() - start
+
+    # Give the monitor a chance to record the lag of a loop that was blocked until now
+    await asyncio.sleep(0.01)
+    monitor.cancel()
+
+    return elapsed, max(lags, default=0.0)
+
+
+async def main(args):
+    db = DBHelper()
+    async_db = AsyncDBHelper(db)
+
+    judge_ids = db.get_all_judges() or ["benchmark-judge"]
+    judge_ids = (judge_ids * args.judges)[: args.judges]
+
+    async def blocking(judge_id):
+        blocking_submission(db, judge_id)
+
+    async def offloaded(judge_id):
+        await offloaded_submission(async_db, judge_id)
+
+    # Warm up the connection pool and the lookup caches first
+    await run(offloaded, judge_ids, 1)
+
+    for label, submission in (("blocking", blocking), ("offloaded", offloaded)):
+        elapsed, max_lag = await run(submission, judge_ids, args.rounds)
+        submissions = len(judge_ids) * args.rounds
+        print(
+            f"{label:>9}: {submissions} submissions in {elapsed:.3f}s "
+            f"({submissions / elapsed:.1f}/s), max event loop lag {max_lag * 1000:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--judges", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=5)
+    asyncio.get_event_loop().run_until_complete(main(parser.parse_args()))
@@ -0,0 +1,86 @@
+# coding: utf-8
+# Compare the latency of the conversation tracking backends
+# Run this from the app folder (so that settings.py is picked up):
+#   python ../scripts/benchmarks/conversation_backends.py --operations 1000
+# The Firestore backend is only included with --firestore, since it needs credentials and writes to the conversations collection
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.getcwd())
+
+from databases.conversations import MemoryConn, SQLiteConn
+
+INITIAL_STATE, TEAM_CHOOSE = 0, 1
+
+
+def initial_state(user_id):
+    return INITIAL_STATE
+
+
+def measure(operation, operations):
+    timings = []
+    for i in range(operations):
+        start = time.perf_counter()
+        operation(i)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    print(
+        f"{label:>24}: median {statistics.median(timings) * 1000:.3f}ms, "
+        f"p99 {timings[int(len(timings) * 0.99) - 1] * 1000:.3f}ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--operations", type=int, default=1000)
+    parser.add_argument("--firestore", action="store_true")
+    args = parser.parse_args()
+
+    backends = [
+        ("memory", MemoryConn(initial_state)),
+        (
+            "sqlite",
+            SQLiteConn(
+                initial_state, path=os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+            ),
+        ),
+    ]
+    if args.firestore:
+        from databases.firebaser import FireConn
+
+        backends.append(("firestore (uncached)", FireConn(initial_state, ttl=0)))
+        backends.append(("firestore (cached)", FireConn(initial_state)))
+
+    for name, backend in backends:
+        channel = f"benchmark-{int(time.time())}"
+        users = [f"benchmark-user-{i}" for i in range(args.operations)]
+
+        report(
+            f"{name} change_state",
+            measure(
+                lambda i: backend.change_state(channel, users[i], INITIAL_STATE),
+                args.operations,
+            ),
+        )
+        report(
+            f"{name} get_state",
+            measure(lambda i: backend.get_state(channel, users[i]), args.operations),
+        )
+        report(
+            f"{name} transition",
+            measure(
+                lambda i: backend.transition(
+                    channel, users[i], (INITIAL_STATE,), TEAM_CHOOSE
+                ),
+                args.operations,
+            ),
+        )
@@ -0,0 +1,61 @@
+# coding: utf-8
+# Benchmark the database work done while a worker boots, with and without the schema checks that used to run on import
+# Run this from the app folder (so that settings.py is picked up) against a migrated database:
+#   python ../scripts/benchmarks/import_time.py --boots 10
+# The legacy path only issues conditional CREATE statements, so this is safe to run against a live database
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.getcwd())
+
+from databases.dbhelper import DBHelper
+
+
+# Drop the process-wide engine so that every boot has to open new connections like a fresh worker does
+def reset_engine():
+    if DBHelper.engine is not None:
+        DBHelper.engine.dispose()
+    DBHelper.engine = None
+    DBHelper.engine_pid = None
+
+
+# What importing dbhelper.py and config.py used to do before serving the first request
+def legacy_boot():
+    db = DBHelper()
+    db.metadata.create_all(db.get_engine())
+    if not db.get_all_categories():
+        db.add_all_categories()
+    db.is_judge("benchmark-judge")
+
+
+# Without any DDL, the first query only needs a pooled connection
+def current_boot():
+    db = DBHelper()
+    db.is_judge("benchmark-judge")
+
+
+def measure(boot, boots):
+    timings = []
+    for _ in range(boots):
+        reset_engine()
+        start = time.perf_counter()
+        boot()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--boots", type=int, default=10)
+    args = parser.parse_args()
+
+    for label, boot in (("with DDL", legacy_boot), ("no DDL", current_boot)):
+        timings = measure(boot, args.boots)
+        print(
+            f"{label:>8}: median {statistics.median(timings) * 1000:.1f}ms, "
+            f"max {max(timings) * 1000:.1f}ms over {args.boots} boots"
+        )
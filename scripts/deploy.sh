@@ -31,6 +31,9 @@ mysql -u root -p < "db_scripts/setup.sql"
 
 /etc/init.d/mysql restart
 
-# Run Gunicorn
+# Create or upgrade the database schema before any worker is started
 cd "../app"
+python migrate.py
+
+# Run Gunicorn
 gunicorn main:app -w 4 -k uvicorn.workers.UvicornWorker
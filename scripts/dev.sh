@@ -19,5 +19,8 @@ ngrok authtoken $AUTHTOKEN
 # Ensure that ngrok's port forwards to FastAPI's port
 ngrok http 8000 &
 
+# Create or upgrade the database schema
+python migrate.py
+
 # Run main bot code
 uvicorn main:app --reload --port 8000
@@ -0,0 +1,47 @@
+# coding: utf-8
+# Make the bot's modules importable the same way as when running from the app folder
+# Also provides a DBHelper on SQLite for the tests of the database logic
+
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "app"))
+
+
+# DBHelper on a fresh SQLite database with the full schema, for testing the database logic without a MySQL server
+# The MySQL-only parts of the schema are emulated: TINYINT columns and the uuid() function used for primary keys
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    import settings
+
+    from sqlalchemy import event
+    from sqlalchemy.dialects.mysql import TINYINT
+    from sqlalchemy.ext.compiler import compiles
+
+    from databases.dbhelper import DBHelper
+
+    @compiles(TINYINT, "sqlite")
+    def compile_tinyint(element, compiler, **kwargs):
+        return "INTEGER"
+
+    monkeypatch.setattr(settings, "DB_URL", f"sqlite:///{tmp_path / 'sutdwth.sqlite3'}")
+    monkeypatch.setattr(DBHelper, "engine", None)
+    monkeypatch.setattr(DBHelper, "engine_pid", None)
+
+    engine = DBHelper.get_engine()
+    event.listen(
+        engine,
+        "connect",
+        lambda connection, record: connection.create_function(
+            "uuid", 0, lambda: str(uuid.uuid4())
+        ),
+    )
+    DBHelper.metadata.create_all(engine)
+
+    yield DBHelper()
+
+    DBHelper.Session.remove()
+    engine.dispose()
@@ -0,0 +1,146 @@
+# coding: utf-8
+# Tests that the incrementally maintained score aggregates stay equal to the aggregates of the Score table
+
+import pytest
+
+import settings
+
+from databases.dbhelper import AGGREGATE_COLUMNS
+
+CATEGORIES = settings.CATEGORIES[:2]
+GROUPS = ("Alpha", "Beta")
+
+
+@pytest.fixture
+def db(sqlite_db):
+    sqlite_db.add_all_categories()
+
+    session = sqlite_db.session_factory()
+    try:
+        session.add_all(
+            sqlite_db.Group(name=name, group_leader_id="P1") for name in GROUPS
+        )
+        session.commit()
+    finally:
+        session.close()
+
+    return sqlite_db
+
+
+# Non-empty aggregates as stored in the ScoreAggregate table
+def stored_aggregates(db):
+    session = db.session_factory()
+    try:
+        rows = session.query(
+            db.ScoreAggregate.group_id,
+            db.ScoreAggregate.category_id,
+            *(getattr(db.ScoreAggregate, column) for column in AGGREGATE_COLUMNS),
+        ).all()
+    finally:
+        session.close()
+
+    return {
+        (row[0], row[1]): tuple(row[2:])
+        for row in rows
+        if any(row[2:])
+    }
+
+
+# Aggregates recomputed from the Score table
+def recomputed_aggregates(db):
+    session = db.session_factory()
+    try:
+        scores = session.query(db.Score).all()
+    finally:
+        session.close()
+
+    aggregates = {}
+    for score in scores:
+        key = (score.group_id, score.category_id)
+        sums = aggregates.get(key, (0,) * len(AGGREGATE_COLUMNS))
+        aggregates[key] = (
+            sums[0] + score.criteria_1_score,
+            sums[1] + score.criteria_2_score,
+            sums[2] + score.criteria_3_score,
+            sums[3] + score.criteria_4_score,
+            sums[4] + 1,
+        )
+
+    return aggregates
+
+
+def test_build_aggregate_delta(db):
+    assert db.build_aggregate_delta("G1", "C1", None, (1, 2, 3, 4)) == {
+        "group_id": "G1",
+        "category_id": "C1",
+        "criteria_1_sum": 1,
+        "criteria_2_sum": 2,
+        "criteria_3_sum": 3,
+        "criteria_4_sum": 4,
+        "judge_count": 1,
+    }
+
+    edit = db.build_aggregate_delta("G1", "C1", (1, 2, 3, 4), (4, 3, 2, 1))
+    assert [edit[column] for column in AGGREGATE_COLUMNS] == [3, 1, -1, -3, 0]
+
+    deletion = db.build_aggregate_delta("G1", "C1", (1, 2, 3, 4), None)
+    assert [deletion[column] for column in AGGREGATE_COLUMNS] == [-1, -2, -3, -4, -1]
+
+
+def test_aggregates_follow_added_edited_and_deleted_scores(db):
+    first, second = CATEGORIES
+
+    db.add_score("J1", "Alpha", first, 5, 6, 7, 8)
+    db.add_score("J2", "Alpha", first, 1, 2, 3, 4)
+    db.add_scores_bulk("J1", "Beta", {first: (2, 2, 2, 2), second: (9, 9, 9, 9)})
+    assert stored_aggregates(db) == recomputed_aggregates(db)
+
+    db.edit_score("J2", "Alpha", first, 4, 3, 2, 1)
+    db.edit_scores_bulk("J1", "Beta", {first: (3, 3, 3, 3), second: (1, 1, 1, 1)})
+    assert stored_aggregates(db) == recomputed_aggregates(db)
+
+    db.delete_score("J1", "Alpha", first)
+    db.delete_score("J1", "Beta", second)
+    assert stored_aggregates(db) == recomputed_aggregates(db)
+
+    # Deleting a score that does not exist does not change anything
+    db.delete_score("J1", "Beta", second)
+    assert stored_aggregates(db) == recomputed_aggregates(db)
+
+    assert db.rebuild_score_aggregates() == []
+    assert stored_aggregates(db) == recomputed_aggregates(db)
+
+
+def test_failed_submission_does_not_change_the_aggregates(db):
+    first = CATEGORIES[0]
+    db.add_score("J1", "Alpha", first, 5, 6, 7, 8)
+
+    # A judge can only score a group once per category
+    with pytest.raises(Exception):
+        db.add_score("J1", "Alpha", first, 1, 1, 1, 1)
+
+    assert stored_aggregates(db) == recomputed_aggregates(db)
+
+
+def test_rebuild_repairs_drifted_aggregates(db):
+    first, second = CATEGORIES
+    db.add_score("J1", "Alpha", first, 5, 6, 7, 8)
+    db.add_score("J1", "Beta", second, 1, 2, 3, 4)
+
+    expected = recomputed_aggregates(db)
+    alpha = (db.get_group_id("Alpha"), db.get_category_id(first))
+
+    session = db.session_factory()
+    try:
+        session.query(db.ScoreAggregate).filter(
+            db.ScoreAggregate.group_id == alpha[0]
+        ).update({db.ScoreAggregate.criteria_1_sum: 50})
+        session.commit()
+    finally:
+        session.close()
+
+    assert db.rebuild_score_aggregates() == [
+        ("Alpha", first, expected[alpha], (50,) + expected[alpha][1:])
+    ]
+    assert stored_aggregates(db) == expected
+    assert db.rebuild_score_aggregates() == []
@@ -0,0 +1,158 @@
+# coding: utf-8
+# Tests for the in-process caches of the database lookups
+
+import time
+
+import pytest
+
+from databases.dbhelper import LookupCache, RosterCache
+
+
+# Loader that counts how many times the table has been loaded
+class CountingLoader:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return list(self.rows)
+
+
+@pytest.fixture
+def groups():
+    return CountingLoader([("G1", "Alpha"), ("G2", "Beta")])
+
+
+def test_lookups_are_served_from_a_single_load(groups):
+    cache = LookupCache(groups, ttl=60)
+
+    assert cache.get_id("Alpha") == "G1"
+    assert cache.get_id("Beta") == "G2"
+    assert cache.get_name("G1") == "Alpha"
+    assert groups.calls == 1
+
+
+def test_miss_reloads_rows_inserted_elsewhere(groups):
+    cache = LookupCache(groups, ttl=60)
+    assert cache.get_id("Alpha") == "G1"
+
+    groups.rows.append(("G3", "Gamma"))
+
+    assert cache.get_id("Gamma") == "G3"
+    assert cache.get_name("G3") == "Gamma"
+    assert groups.calls == 2
+
+
+def test_missing_row_raises_index_error(groups):
+    cache = LookupCache(groups, ttl=60)
+
+    with pytest.raises(IndexError):
+        cache.get_id("Nonexistent")
+
+    with pytest.raises(IndexError):
+        cache.get_name("G9")
+
+
+def test_lookups_reload_after_the_ttl(groups):
+    cache = LookupCache(groups, ttl=0.1)
+    assert cache.get_id("Alpha") == "G1"
+
+    groups.rows = [("G1", "Alpha Renamed")]
+    assert cache.get_name("G1") == "Alpha"
+
+    time.sleep(0.2)
+    assert cache.get_name("G1") == "Alpha Renamed"
+    assert groups.calls == 2
+
+
+def test_invalidate_forces_a_reload(groups):
+    cache = LookupCache(groups, ttl=60)
+    assert cache.get_name("G1") == "Alpha"
+
+    groups.rows = [("G1", "Alpha Renamed")]
+    cache.invalidate()
+
+    assert cache.get_name("G1") == "Alpha Renamed"
+    assert groups.calls == 2
+
+
+def test_roster_membership_is_served_from_the_cache():
+    judges = CountingLoader([("U1",), ("U2",)])
+    roster = RosterCache(judges, ttl=60)
+
+    assert "U1" in roster
+    assert "U2" in roster
+    assert "U3" not in roster
+    assert judges.calls == 1
+
+
+def test_roster_reloads_after_the_ttl():
+    judges = CountingLoader([("U1",)])
+    roster = RosterCache(judges, ttl=0.1)
+    assert "U2" not in roster
+
+    judges.rows.append(("U2",))
+    assert "U2" not in roster
+
+    time.sleep(0.2)
+    assert "U2" in roster
+
+
+# A commit made while the roster was being loaded might not be part of the loaded rows
+def test_invalidation_during_a_refresh_keeps_the_roster_stale():
+    roster = RosterCache(lambda: roster.invalidate() or [("U1",)], ttl=60)
+
+    assert "U1" in roster
+    assert roster.is_stale()
+
+
+def test_caches_are_invalidated_once_orm_writes_are_committed(sqlite_db):
+    db = sqlite_db
+    assert not db.is_judge("U1")
+
+    session = db.session_factory()
+    try:
+        session.add(db.Judge(judge_id="U1", name="Judge"))
+        session.add(db.Group(name="Alpha", group_leader_id="P1"))
+        session.flush()
+
+        # Nothing has been committed yet
+        assert not db.judge_roster.is_stale()
+        with pytest.raises(IndexError):
+            db.get_group_id("Alpha")
+
+        session.commit()
+    finally:
+        session.close()
+
+    assert db.judge_roster.is_stale()
+    assert db.is_judge("U1")
+    assert db.get_group_name(db.get_group_id("Alpha")) == "Alpha"
+
+
+def test_rolled_back_writes_do_not_invalidate_the_caches(sqlite_db):
+    db = sqlite_db
+    assert not db.is_judge("U1")
+
+    session = db.session_factory()
+    try:
+        session.add(db.Judge(judge_id="U1", name="Judge"))
+        session.flush()
+        session.rollback()
+    finally:
+        session.close()
+
+    assert not db.judge_roster.is_stale()
+    assert not db.is_judge("U1")
+
+
+def test_judge_writes_invalidate_the_roster(sqlite_db):
+    db = sqlite_db
+    assert not db.is_judge("U1")
+
+    db.add_judge("U1", "Judge")
+    assert db.is_judge("U1")
+
+    db.delete_judge("U1")
+    assert not db.is_judge("U1")
@@ -0,0 +1,205 @@
+# coding: utf-8
+# Conformance tests that every conversation tracking backend has to pass
+# The Firestore backend is only tested if a Firestore emulator is available (with FIRESTORE_EMULATOR_HOST set)
+
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from databases.conversations import MemoryConn, SQLiteConn, AsyncConversationBackend
+
+INITIAL_STATE, TEAM_CHOOSE, TEAM_SCORE, TEAM_REMARKS = range(4)
+CONVERSATION_END = 7
+
+JUDGED_USER = "U_JUDGED"
+
+
+def initial_state(user_id):
+    return CONVERSATION_END if user_id == JUDGED_USER else INITIAL_STATE
+
+
+@pytest.fixture(params=["memory", "sqlite", "firestore"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryConn(initial_state)
+
+    if request.param == "sqlite":
+        return SQLiteConn(initial_state, path=str(tmp_path / "conversations.sqlite3"))
+
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        pytest.skip("Firestore emulator is not available")
+
+    from databases.firebaser import FireConn
+
+    return FireConn(initial_state, ttl=0)
+
+
+@pytest.fixture
+def async_backend(backend):
+    if isinstance(backend, (MemoryConn, SQLiteConn)):
+        return AsyncConversationBackend(backend)
+
+    from databases.firebaser import AsyncFireConn
+
+    return AsyncFireConn(backend)
+
+
+def test_untracked_conversation_starts_in_initial_state(backend):
+    assert backend.get_state("C1", "U1") == INITIAL_STATE
+    assert backend.get_state("C1", JUDGED_USER) == CONVERSATION_END
+    assert backend.get_ts("C1", "U1") is None
+
+
+def test_state_and_timestamp_are_independent(backend):
+    backend.change_state("C1", "U1", TEAM_CHOOSE)
+    backend.change_ts("C1", "U1", "1600000000.000100")
+    assert backend.get_state("C1", "U1") == TEAM_CHOOSE
+
+    backend.change_state("C1", "U1", TEAM_SCORE)
+    assert backend.get_ts("C1", "U1") == "1600000000.000100"
+
+    backend.change_state_ts("C1", "U1", TEAM_REMARKS, "1600000000.000200")
+    assert backend.get_state("C1", "U1") == TEAM_REMARKS
+    assert backend.get_ts("C1", "U1") == "1600000000.000200"
+
+
+def test_remark_context_is_stored_with_the_timestamp(backend):
+    remark = {"group_id": "G1", "group_name": "Team 1", "categories": ["A", "B"]}
+
+    assert backend.get_remark("C1", "U1") is None
+
+    backend.change_state("C1", "U1", TEAM_REMARKS)
+    backend.change_ts_remark("C1", "U1", "1600000000.000300", remark)
+    assert backend.get_ts("C1", "U1") == "1600000000.000300"
+    assert backend.get_remark("C1", "U1") == remark
+    assert backend.get_state("C1", "U1") == TEAM_REMARKS
+
+    async def read():
+        return await AsyncConversationBackend(backend).get_remark("C1", "U1")
+
+    assert asyncio.run(read()) == remark
+
+
+def test_transition_can_clear_the_previous_remark_thread(backend):
+    backend.change_state("C1", "U1", TEAM_SCORE)
+    backend.change_ts_remark("C1", "U1", "1.5", {"group_id": "G1"})
+
+    assert backend.transition(
+        "C1", "U1", (TEAM_SCORE,), TEAM_REMARKS, clear_remark=True
+    )
+    assert backend.get_state("C1", "U1") == TEAM_REMARKS
+    assert backend.get_ts("C1", "U1") is None
+    assert backend.get_remark("C1", "U1") is None
+
+
+def test_conversations_are_kept_per_channel_and_user(backend):
+    backend.change_state("C1", "U1", TEAM_SCORE)
+    backend.change_state("C2", "U1", TEAM_CHOOSE)
+    backend.change_state("C1", "U2", TEAM_REMARKS)
+
+    assert backend.get_state("C1", "U1") == TEAM_SCORE
+    assert backend.get_state("C2", "U1") == TEAM_CHOOSE
+    assert backend.get_state("C1", "U2") == TEAM_REMARKS
+
+
+def test_transition_only_from_expected_states(backend):
+    assert backend.transition("C1", "U1", (INITIAL_STATE,), TEAM_CHOOSE)
+    assert not backend.transition("C1", "U1", (INITIAL_STATE,), TEAM_CHOOSE)
+    assert not backend.transition("C1", JUDGED_USER, (INITIAL_STATE,), TEAM_CHOOSE)
+
+    assert backend.transition("C1", "U1", (TEAM_CHOOSE,), TEAM_SCORE, ts="1.5")
+    assert backend.get_state("C1", "U1") == TEAM_SCORE
+    assert backend.get_ts("C1", "U1") == "1.5"
+
+    assert backend.transition("C1", "U1", (TEAM_SCORE,), TEAM_REMARKS)
+    assert backend.get_ts("C1", "U1") == "1.5"
+
+
+def test_concurrent_transitions_have_one_winner(backend):
+    backend.change_state("C1", "U1", TEAM_SCORE)
+    results = []
+
+    def submit():
+        results.append(backend.transition("C1", "U1", (TEAM_SCORE,), TEAM_REMARKS))
+
+    threads = [threading.Thread(target=submit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 1
+    assert backend.get_state("C1", "U1") == TEAM_REMARKS
+
+
+def test_async_api_shares_conversations_with_sync_api(backend, async_backend):
+    async def judge():
+        assert await async_backend.get_state("C1", "U1") == INITIAL_STATE
+        assert await async_backend.transition(
+            "C1", "U1", (INITIAL_STATE,), TEAM_CHOOSE, ts="2.5"
+        )
+        assert not await async_backend.transition(
+            "C1", "U1", (INITIAL_STATE,), TEAM_CHOOSE
+        )
+        await async_backend.change_state("C1", "U1", TEAM_SCORE)
+
+    asyncio.run(judge())
+
+    assert backend.get_state("C1", "U1") == TEAM_SCORE
+    assert backend.get_ts("C1", "U1") == "2.5"
+
+
+def test_release_returns_to_the_initial_state(backend, async_backend):
+    backend.change_state("C1", "U1", TEAM_SCORE)
+    backend.change_state("C1", JUDGED_USER, TEAM_CHOOSE)
+
+    backend.release("C1", "U1")
+    asyncio.run(async_backend.release("C1", JUDGED_USER))
+
+    assert backend.get_state("C1", "U1") == INITIAL_STATE
+    assert backend.get_state("C1", JUDGED_USER) == CONVERSATION_END
+
+
+def test_seed_only_tracks_new_conversations(backend):
+    backend.change_state("C1", "U1", TEAM_SCORE)
+
+    seeded = backend.seed(
+        ["C1", "C2"], {"U1": INITIAL_STATE, JUDGED_USER: CONVERSATION_END}
+    )
+
+    assert seeded == 3
+    assert backend.get_state("C1", "U1") == TEAM_SCORE
+    assert backend.get_state("C2", "U1") == INITIAL_STATE
+    assert backend.get_state("C2", JUDGED_USER) == CONVERSATION_END
+    assert backend.seed(["C1", "C2"], {"U1": INITIAL_STATE}) == 0
+
+
+def test_sweep_expires_idle_and_resets_abandoned_conversations(backend):
+    backend.change_state("C1", "U_EXPIRED", CONVERSATION_END)
+    backend.change_state("C1", "U_EXPIRED_SCORING", TEAM_SCORE)
+    time.sleep(0.02)
+    expire_before = time.time()
+    time.sleep(0.02)
+
+    backend.change_state("C1", "U_ABANDONED", TEAM_CHOOSE)
+    backend.change_state("C1", JUDGED_USER, TEAM_SCORE)
+    backend.change_state("C1", "U_REMARKING", TEAM_REMARKS)
+    time.sleep(0.02)
+    abandoned_before = time.time()
+    time.sleep(0.02)
+
+    backend.change_state("C1", "U_SCORING", TEAM_SCORE)
+
+    assert backend.sweep(
+        expire_before, abandoned_before, (TEAM_CHOOSE, TEAM_SCORE)
+    ) == (2, 2)
+
+    assert backend.read("C1", "U_EXPIRED") == {}
+    assert backend.read("C1", "U_EXPIRED_SCORING") == {}
+    assert backend.get_state("C1", "U_ABANDONED") == INITIAL_STATE
+    assert backend.get_state("C1", JUDGED_USER) == CONVERSATION_END
+    assert backend.get_state("C1", "U_REMARKING") == TEAM_REMARKS
+    assert backend.get_state("C1", "U_SCORING") == TEAM_SCORE
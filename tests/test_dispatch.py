@@ -0,0 +1,150 @@
+# coding: utf-8
+# Tests for the payload predicates that decide which handlers run for an event
+
+import asyncio
+import functools
+import json
+import threading
+import time
+
+import pytest
+
+from fastapi import FastAPI
+from slackers.hooks import commands, responder
+from slackers.verification import check_timeout, verify_signature
+from starlette.responses import JSONResponse, Response
+
+import dispatch
+from dispatch import accepts, has_subtype, in_channels, is_thread_reply, replies_to, when
+
+
+def message(**event):
+    return {"event": {"type": "message", "channel": "C1", "ts": "2", **event}}
+
+
+@when(
+    is_thread_reply,
+    replies_to("UBOT"),
+    has_subtype(None, "file_share"),
+    in_channels(["C1"]),
+)
+def handle_reply(payload):
+    pass
+
+
+def test_handler_accepts_matching_thread_replies():
+    assert accepts(handle_reply, message(thread_ts="1", parent_user_id="UBOT"))
+    assert accepts(
+        handle_reply,
+        message(thread_ts="1", parent_user_id="UBOT", subtype="file_share"),
+    )
+
+
+def test_handler_rejects_other_messages():
+    assert not accepts(handle_reply, message())
+    assert not accepts(handle_reply, message(ts="1", thread_ts="1"))
+    assert not accepts(handle_reply, message(thread_ts="1", parent_user_id="U2"))
+    assert not accepts(
+        handle_reply,
+        message(thread_ts="1", parent_user_id="UBOT", subtype="message_changed"),
+    )
+    assert not accepts(
+        handle_reply, message(channel="C2", thread_ts="1", parent_user_id="UBOT")
+    )
+
+
+def test_empty_channel_allow_list_allows_every_channel():
+    assert in_channels([])(message(channel="C2"))
+
+
+def test_handler_without_predicates_accepts_everything():
+    assert accepts(lambda payload: None, message())
+
+
+@pytest.fixture
+def client():
+    from starlette.testclient import TestClient
+
+    app = FastAPI()
+    app.include_router(dispatch.router)
+    app.dependency_overrides[verify_signature] = lambda: None
+    app.dependency_overrides[check_timeout] = lambda: None
+
+    return TestClient(app)
+
+
+def test_corrected_submission_of_a_rejected_view_is_handled(client):
+    submitted = []
+
+    @responder("view_submission:test_score_submission")
+    def validate(payload):
+        value = payload["view"]["state"]["values"]["score"]["score"]["value"]
+        submitted.append(value)
+
+        if not value.isdecimal():
+            return JSONResponse({"response_action": "errors", "errors": {"score": "No"}})
+        return Response()
+
+    # A rejected view keeps its ID and hash, only the trigger ID of the submission changes
+    def submit(trigger_id, value):
+        payload = {
+            "token": "t",
+            "type": "view_submission",
+            "trigger_id": trigger_id,
+            "view": {
+                "id": "V1",
+                "hash": "h1",
+                "callback_id": "test_score_submission",
+                "state": {"values": {"score": {"score": {"value": value}}}},
+            },
+        }
+        return client.post("/actions", data={"payload": json.dumps(payload)})
+
+    rejected = submit("1.1.1", "abc")
+    assert rejected.json()["response_action"] == "errors"
+
+    accepted = submit("2.2.2", "42")
+    assert accepted.status_code == 200
+    assert submitted == ["abc", "42"]
+
+
+def test_sync_handlers_do_not_block_the_event_loop():
+    finished = []
+
+    def blocking(payload):
+        time.sleep(0.2)
+        finished.append("blocking")
+
+    async def quick(payload):
+        finished.append("quick")
+
+    async def run():
+        await asyncio.gather(
+            dispatch.run_handler(commands, "blocking", blocking, {}),
+            dispatch.run_handler(commands, "quick", quick, {}),
+        )
+
+    asyncio.run(run())
+    assert finished == ["quick", "blocking"]
+
+
+def test_web_api_calls_of_sync_handlers_run_on_the_attached_loop():
+    pytest.importorskip("slack")
+    from outbound import SlackGateway
+
+    class Client:
+        async def chat_postMessage(self, **kwargs):
+            return threading.get_ident()
+
+    gateway = SlackGateway(Client(), workers=1)
+
+    async def run():
+        loop = asyncio.get_event_loop()
+        gateway.attach(loop)
+
+        future = await loop.run_in_executor(
+            None, functools.partial(gateway.chat_postMessage, channel="C1", text="Hi")
+        )
+        return await asyncio.wrap_future(future)
+
+    assert asyncio.run(run()) == threading.get_ident()
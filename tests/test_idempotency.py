@@ -0,0 +1,69 @@
+# coding: utf-8
+# Tests for recognizing redelivered Slack events and interactions
+
+import time
+
+import pytest
+
+from idempotency import MemoryDeliveries, SQLiteDeliveries, delivery_key
+from slackers.models import SlackAction, SlackEnvelope
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def deliveries(request, tmp_path):
+    if request.param == "memory":
+        return MemoryDeliveries(ttl=0.2)
+
+    return SQLiteDeliveries(ttl=0.2, path=str(tmp_path / "deliveries.sqlite3"))
+
+
+def test_only_the_first_delivery_is_claimed(deliveries):
+    assert deliveries.claim("event:Ev1")
+    assert not deliveries.claim("event:Ev1")
+    assert deliveries.claim("event:Ev2")
+
+
+def test_deliveries_are_forgotten_after_the_ttl(deliveries):
+    assert deliveries.claim("event:Ev1")
+    time.sleep(0.3)
+    assert deliveries.claim("event:Ev1")
+
+
+def test_memory_deliveries_are_bounded():
+    deliveries = MemoryDeliveries(ttl=60, max_entries=2)
+
+    for key in ("a", "b", "c"):
+        assert deliveries.claim(key)
+
+    assert len(deliveries.expiry) == 2
+    assert deliveries.claim("a")
+
+
+def test_delivery_keys():
+    envelope = SlackEnvelope(
+        token="t",
+        team_id="T1",
+        api_app_id="A1",
+        event={"type": "message"},
+        type="event_callback",
+        event_id="Ev1",
+        event_time=0,
+    )
+    assert delivery_key("event", envelope) == "event:Ev1"
+
+    # Each submission of the same view has its own trigger ID
+    submission = SlackAction(
+        token="t",
+        type="view_submission",
+        trigger_id="4.5.6",
+        view={"id": "V1", "hash": "h1"},
+    )
+    assert delivery_key("action", submission) == "view_submission:4.5.6"
+
+    closure = SlackAction(token="t", type="view_closed", view={"id": "V1", "hash": "h1"})
+    assert delivery_key("action", closure) is None
+
+    click = SlackAction(token="t", type="block_actions", trigger_id="1.2.3")
+    assert delivery_key("action", click) == "block_actions:1.2.3"
+
+    assert delivery_key("action", SlackAction(token="t", type="block_actions")) is None
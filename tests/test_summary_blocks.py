@@ -0,0 +1,77 @@
+# coding: utf-8
+# Tests for splitting the scoring summary over messages within Slack's block limit
+
+import settings
+
+from handlers.viewing.summary_blocks import chunk_blocks, summary_entries
+
+
+def scores(groups, categories=3):
+    return [
+        (
+            f"Category {index % categories}",
+            f"Group {index:03d}",
+            1,
+            2,
+            3,
+            4,
+            "https://files.slack.com/remarks.png" if index % 2 else None,
+            "Great pitch" if index % 3 == 0 else None,
+        )
+        for index in sorted(range(groups), key=lambda index: index % categories)
+    ]
+
+
+def block_text(block):
+    return block.get("text", {}).get("text", "")
+
+
+def test_no_message_goes_over_the_block_limit():
+    messages = list(chunk_blocks(summary_entries("U1", scores(200))))
+
+    assert len(messages) > 1
+    assert all(len(blocks) <= settings.MAX_BLOCKS_PER_MESSAGE for blocks in messages)
+
+
+def test_all_blocks_are_sent_in_order():
+    entries = list(summary_entries("U1", scores(200)))
+    messages = list(chunk_blocks(iter(entries)))
+
+    assert [block for blocks in messages for block in blocks] == [
+        block for entry in entries for block in entry
+    ]
+
+
+def test_blocks_of_a_group_are_never_split_across_messages():
+    messages = list(chunk_blocks(summary_entries("U1", scores(200))))
+
+    for index in range(200):
+        group_name = f"*Group {index:03d}*"
+        holding = [
+            number
+            for number, blocks in enumerate(messages)
+            if any(group_name in block_text(block) for block in blocks)
+        ]
+        assert len(holding) == 1
+
+
+def test_entries_exactly_at_the_limit():
+    limit = 5
+    full = [{"type": "divider"}] * limit
+
+    # An entry that fills a message on its own gets its own message
+    assert list(chunk_blocks([[{"type": "section"}], full, [{"type": "section"}]], limit)) == [
+        [{"type": "section"}],
+        full,
+        [{"type": "section"}],
+    ]
+
+    # Entries that add up to exactly the limit share a message
+    assert list(chunk_blocks([full[:2], full[:3], full[:1]], limit)) == [
+        full,
+        full[:1],
+    ]
+
+
+def test_no_entries_give_no_messages():
+    assert list(chunk_blocks([])) == []